@@ -1,103 +1,379 @@
 import os
+import hmac
 import json
 import threading
-from model.preprocess import preprocess_frame
-from model import track_util
-from flask import Flask, jsonify, abort, request, Response
+import time
+from model.preprocess import preprocess_frames, preprocess_row, FRAME_FIELDS
+from model import artifacts, track_util, track_cache
+from model.telemetry_store import TelemetryStore
+from flask import Flask, jsonify, abort, request, Response, g
 from flask_cors import cross_origin, CORS
-from keras.models import load_model
-from datetime import datetime, timedelta
 import numpy as np
-import model.gradientAscent as gradient_ascent
-import textToSpeech
+from model.numpy_mlp import NumpyMLP, NumpySuggestionEngine
+import metrics
+from inference import BatchPredictor
+from online import ModelSlot, OnlineTrainer
+from llm import LLMTimeout
+from speech import SpeechService, make_tts_client
+from replay import ReplayClock, ReplaySessions
+from race import RACE_DATA_DIR, RaceRegistry
 import os
 from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
 
 load_dotenv()
 
 BASE_DIR = os.path.dirname(__file__)
-MODEL_PATH = os.path.join(BASE_DIR, "model", "model.keras")
+# The latest published training run (python -m model.train), unless $MODEL_PATH says otherwise
+MODEL_PATH = artifacts.resolve_model_path(os.path.join(BASE_DIR, "model", "model.keras"))
 SAMPLE_JSON_PATH = os.path.join(BASE_DIR, "data", "sample.json")
+# Shared secret for changing the profiler's sample rate at runtime (POST /debug/profile)
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
 
 app = Flask(__name__)
 CORS(app)
 
-client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+cars, corner_points = track_cache.load_track_info(None)
+# Every driver of every session under RACE_DATA_DIR, labelled in a process pool. The workers
+# are forked, so this runs while the process has a single thread: before textToSpeech brings
+# in FAISS and its OpenMP pool, before Keras, and before the batching threads below start.
+race_registry = RaceRegistry.from_directory(RACE_DATA_DIR)
+if len(cars) and "default" not in race_registry:
+    race_registry.add("default", {int(cars["driver_number"][0]): cars}, corner_points)
+
+import textToSpeech
 
-# Load Keras model (if available)
+client = make_tts_client()
+speech = SpeechService.from_env(client)
+
+# Load the model (if available). The default NumPy engine serves the exported
+# weights without importing TensorFlow; MODEL_BACKEND=keras uses Keras itself.
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "numpy").lower()
 model = None
 try:
-    model = load_model(MODEL_PATH)
-    print(f"Loaded model from {MODEL_PATH}")
+    if MODEL_BACKEND == "keras":
+        from keras.models import load_model
+        model = load_model(MODEL_PATH)
+    else:
+        model = NumpyMLP.from_keras(MODEL_PATH)
+    print(f"Loaded model from {MODEL_PATH} ({MODEL_BACKEND})")
 except Exception as e:
     print(f"Failed to load model from {MODEL_PATH}: {e}")
-cars, corner_points = track_util.get_track_info(None)
+
+# Frames from every car/session share one model call per batch. Each batch reads the
+# slot once, so a model promoted by the online trainer is picked up between batches.
+model_slot = ModelSlot(model, MODEL_PATH)
+predictor = BatchPredictor(metrics.timed("model_batch", lambda x: model_slot.model.predict(x, verbose=0)))
 average_lap_time = 93.0  # seconds
 suggestion_variables = ["throttle", "brake", "speed", "rpm"]
 
+# Gradient ascent only moves the driver-controlled inputs, warm-started from the real frame
+if model is None:
+    suggestion_engine = None
+elif MODEL_BACKEND == "keras":
+    import model.gradientAscent as gradient_ascent
+    suggestion_engine = gradient_ascent.SuggestionEngine(model, trainable_features=range(len(suggestion_variables)))
+else:
+    suggestion_engine = NumpySuggestionEngine(model, trainable_features=range(len(suggestion_variables)))
+suggester = BatchPredictor(metrics.timed("suggest_batch", lambda x: suggestion_engine.optimize(x)[0]))
+
+# ONLINE_TRAINING=1 fine-tunes the NumPy model on replayed frames in the background
+online_trainer = None
+if os.getenv("ONLINE_TRAINING", "0") == "1" and isinstance(model, NumpyMLP):
+    def promote(candidate, version):
+        suggestion_engine.model = candidate
+        print(f"Promoted online model {version}")
+    online_trainer = OnlineTrainer.from_env(model_slot, on_promote=promote).start()
+
 # Load sample.json (expecting a list of dictionaries)
 general_info = {}
-samples = []
+samples = TelemetryStore({})
 if os.path.exists(SAMPLE_JSON_PATH):
     try:
         with open(SAMPLE_JSON_PATH, "r", encoding="utf-8") as f:
             data = json.load(f)
             general_info = data.get("info", {})
-            samples = data.get("data", [])
+            samples = TelemetryStore.from_records(data.get("data", []))
     except Exception as e:
         print(f"Error reading {SAMPLE_JSON_PATH}: {e}")
 else:
     print(f"sample.json not found at {SAMPLE_JSON_PATH}. Starting with empty samples list.")
 
-# Thread-safe index for sequentially returning cars
-_lock = threading.Lock()
-_next_idx = 0
-_next_time = datetime.now()
+
+# Scrape-time gauges for /metrics
+metrics.gauge("batch_queue_depth", "Rows waiting for the next model batch.", lambda: {
+    (("queue", "predict"),): predictor.queue_depth,
+    (("queue", "suggest"),): suggester.queue_depth,
+})
+metrics.gauge("llm_cache_lookups_total", "LLM answer lookups by outcome.", lambda: {
+    (("result", name),): value for name, value in textToSpeech.llm.stats().items() if name in ("hits", "misses", "coalesced")
+}, kind="counter")
+metrics.gauge("llm_failures_total", "LLM calls that timed out or failed.", lambda: {
+    (("reason", "timeout"),): textToSpeech.llm.stats()["timeouts"],
+    (("reason", "error"),): textToSpeech.llm.stats()["errors"],
+}, kind="counter")
+metrics.gauge("llm_cache_hit_ratio", "Share of LLM lookups answered without a new upstream call.", lambda: textToSpeech.llm.stats()["hit_rate"])
+metrics.gauge("llm_in_flight", "LLM calls currently running upstream.", lambda: textToSpeech.llm.stats()["in_flight"])
+metrics.gauge("tts_cache_lookups_total", "Speech clip cache lookups by outcome.", lambda: {
+    (("result", "hits"),): speech.cache.hits,
+    (("result", "misses"),): speech.cache.misses,
+}, kind="counter")
+metrics.gauge("replay_sessions", "Replay sessions currently held by this process.", lambda: len(replay_sessions))
+metrics.gauge("profiled_requests", "Requests sampled by the profiler since the last reset.", lambda: metrics.profiler.profiled)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profile = metrics.profiler.start()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed bodies (/stream, uncached /speak) are timed to the first byte
+    if "request_start" in g:
+        metrics.REGISTRY.observe("request_seconds", time.perf_counter() - g.request_start, "Seconds to produce each response.",
+                                 endpoint=request.endpoint or "unknown", status=str(response.status_code))
+    return response
+
+@app.teardown_request
+def stop_profile(_exc):
+    metrics.profiler.stop(g.pop("profile", None))
+
+def estimate_lap_time(percent_per_second: float) -> float:
+    return average_lap_time + (1 / average_lap_time - percent_per_second) * average_lap_time
+
+def annotate_frame(data: dict) -> dict:
+    """
+    Add model predictions and driver suggestions to a telemetry frame.
+    """
+    with metrics.timer("preprocess_frame"):
+        features = preprocess_row(data)
+    if online_trainer is not None:
+        # Frames from labelled car data still carry track_util's rate here, before it is replaced
+        # Keyed by frame, so a recording served to several replay clients is buffered once
+        key = (data.get("session_key"), data.get("driver_number"), data["date"]) if "date" in data else None
+        online_trainer.observe(features, data.get("percent_per_second"), key)
+    # Both include the wait for a batch to fill; model_batch/suggest_batch time the calls themselves
+    with metrics.timer("predict"):
+        data["percent_per_second"] = predictor.predict(features)
+    data["estimated_lap_time"] = estimate_lap_time(data["percent_per_second"])
+    data["suggestions"] = {}
+    with metrics.timer("suggest"):
+        optimized_input = suggester.submit(features).result()
+    for i, var in enumerate(suggestion_variables):
+        data["suggestions"][var] = float(optimized_input[i] - features[i]) * .01
+    data["info"] = general_info
+    # Keep the lap/sector tables and retrieval index behind /message current with what has been replayed
+    with metrics.timer("lap_summary_update"):
+        textToSpeech.lap_summary.add_frame(data)
+    with metrics.timer("index_frame"):
+        textToSpeech.index_frame(data)
+    return data
+
+# One shared producer replays samples on the original telemetry clock for every /stream subscriber
+replay_clock = ReplayClock(samples, speed=float(os.getenv("REPLAY_SPEED", "1.0")), process_frame=annotate_frame)
+
+# Per-client replays, each with its own cursor and speed (/sessions)
+replay_sessions = ReplaySessions({"sample": samples, "car_data": cars})
+_default_session = None
+_default_session_lock = threading.Lock()
+
+def default_session() -> str:
+    """
+    Session behind a bare /get_data, created on first use.
+    """
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None or replay_sessions.get(_default_session) is None:
+            _default_session, _ = replay_sessions.create("sample", speed=float(os.getenv("REPLAY_SPEED", "1.0")))
+        return _default_session
+
+def next_session_frame(token: str):
+    try:
+        # Mostly sleeping until the frame is due on the replay clock
+        with metrics.timer("replay_wait"):
+            frame = replay_sessions.next_frame(token)
+    except KeyError:
+        return jsonify({"error": "unknown session"}), 404
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 503
+    if frame is None:
+        # No more data
+        return jsonify({"error": "no more data"}), 404
+    frame = annotate_frame(frame)
+    with metrics.timer("jsonify"):
+        return jsonify(frame)
 
 @app.route("/get_data", methods=["GET"])
 def get_next_data():
-    global _next_idx
-    global _next_time
-    with _lock:
-        if _next_idx >= len(samples):
-            # No more data
-            return jsonify({"error": "no more data"}), 404
-
-        data = samples[_next_idx]
-        features = preprocess_frame(data)
-        data["percent_per_second"] = model.predict(np.array([features]), verbose=0).flatten().tolist()[0]
-        data["estimated_lap_time"] = average_lap_time + (1 / average_lap_time - data["percent_per_second"]) * average_lap_time
-        data["suggestions"] = {}
-        optimized_input, _ = gradient_ascent.optimize_input(model, features)
-        for i, var in enumerate(suggestion_variables):
-            data["suggestions"][var] = (optimized_input[0][i] - features[i]) * .01
-        _next_idx += 1
-        while datetime.now() < _next_time:
-            pass  # Busy-wait until the next time slot
-    
-    data["info"] = general_info
-    _next_time = datetime.now() + timedelta(milliseconds=100)
+    """
+    Next frame of ?session=<id>, or of this process's default session.
+    """
+    return next_session_frame(request.args.get("session") or default_session())
+
+@app.route("/sessions", methods=["POST"])
+def create_session():
+    """
+    Start a replay: {"dataset": "sample" | "car_data", "speed": 1.0, "start": 0}.
+    """
+    options = request.get_json(silent=True) or {}
+    try:
+        token, session = replay_sessions.create(
+            options.get("dataset", "sample"), speed=float(options.get("speed", 1.0)), start=int(options.get("start", 0))
+        )
+    except KeyError as e:
+        return jsonify({"error": f"unknown dataset {e}", "datasets": list(replay_sessions.datasets)}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    frames = len(replay_sessions.datasets[session.dataset])
+    return jsonify({"session": token, "dataset": session.dataset, "speed": session.speed, "frames": frames}), 201
+
+@app.route("/sessions/<token>", methods=["DELETE"])
+def release_session(token):
+    if not replay_sessions.release(token):
+        return jsonify({"error": "unknown session"}), 404
+    return "", 204
+
+@app.route("/sessions/<token>/next", methods=["GET"])
+def session_next(token):
+    return next_session_frame(token)
 
-    # Optionally, you could run the model here on the data if the model input format is known.
-    # For now we simply return the data dictionary as-is.
-    return jsonify(data)
+@app.route("/stream", methods=["GET"])
+def stream_data():
+    """
+    Server-sent events feed of annotated frames, paced by the replay clock.
+    """
+    subscription = replay_clock.start().subscribe()
+
+    def events():
+        while not subscription.done:
+            frame = subscription.next(timeout=15)
+            if frame is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"data: {json.dumps(frame)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/race", methods=["GET"])
+def race_sessions():
+    """
+    Loaded sessions with their drivers and time span.
+    """
+    return jsonify(race_registry.describe())
+
+@app.route("/race/<session_key>/frames", methods=["GET"])
+def race_frames(session_key):
+    """
+    Every car's frame at ?at=<ISO time> (or ?offset=<seconds from the session start>),
+    in running order with gaps to the car ahead and to the leader.
+    """
+    if session_key not in race_registry:
+        return jsonify({"error": "unknown session"}), 404
+    session = race_registry[session_key]
+    try:
+        if "at" in request.args:
+            frames = session.frames_at(request.args["at"])
+        else:
+            frames = session.frames_at(session.start + int(float(request.args.get("offset", 0)) * 1_000_000))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(frames)
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/debug/profile", methods=["GET", "POST"])
+def profile_report():
+    """
+    GET: merged profile of the sampled requests (?limit=40&sort=cumulative&reset=1).
+    POST ?rate=0.05 changes the fraction of requests sampled; 0 turns profiling off.
+    POST needs the X-Profile-Token header to match $PROFILE_TOKEN, and is refused when that is unset.
+    """
+    if request.method == "POST":
+        token = request.headers.get("X-Profile-Token", "").encode("utf-8")
+        if not PROFILE_TOKEN or not hmac.compare_digest(token, PROFILE_TOKEN.encode("utf-8")):
+            return jsonify({"error": "changing the sample rate needs a valid X-Profile-Token"}), 403
+        try:
+            rate = float(request.args.get("rate", ""))
+        except ValueError:
+            return jsonify({"error": "rate must be a number between 0 and 1"}), 400
+        if not 0 <= rate <= 1:
+            return jsonify({"error": "rate must be a number between 0 and 1"}), 400
+        metrics.profiler.rate = rate
+        return jsonify({"rate": rate})
+    try:
+        limit = int(request.args.get("limit", 40))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    sort = request.args.get("sort", "cumulative")
+    if sort not in metrics.PROFILE_SORT_KEYS:
+        return jsonify({"error": f"sort must be one of {', '.join(metrics.PROFILE_SORT_KEYS)}"}), 400
+    report = metrics.profiler.report(limit=limit, sort=sort, reset=request.args.get("reset") == "1")
+    return Response(report, mimetype="text/plain")
+
+@app.route("/model", methods=["GET"])
+def model_info():
+    """
+    Version being served, plus the online trainer's rounds and last result when it is running.
+    """
+    info = {"version": model_slot.version, "backend": MODEL_BACKEND, "online_training": online_trainer is not None}
+    if online_trainer is not None:
+        info.update(online_trainer.stats())
+    return jsonify(info)
+
+@app.route("/predict_grid", methods=["POST"])
+def predict_grid():
+    """
+    Predict lap rate for a list of frames (e.g. every car on the grid) in one model call.
+    """
+    frames = request.get_json(silent=True)
+    if not isinstance(frames, list) or not frames:
+        return jsonify({"error": "expected a non-empty list of frames"}), 400
+
+    try:
+        features = preprocess_frames({name: [frame[name] for frame in frames] for name in FRAME_FIELDS})
+    except (KeyError, TypeError) as e:
+        return jsonify({"error": f"invalid frame: {e}"}), 400
+    rates = predictor.predict_many(features)
+    results = []
+    for frame, rate in zip(frames, rates):
+        results.append({
+            "driver_number": frame.get("driver_number"),
+            "percent_per_second": float(rate),
+            "estimated_lap_time": estimate_lap_time(float(rate)),
+        })
+    return jsonify(results)
 
 @app.route("/message", methods=["POST"])
 def send_message():
     query = request.get_data()
-    return textToSpeech.communicate(query)
+    try:
+        return textToSpeech.communicate(query)
+    except LLMTimeout as e:
+        return jsonify({"error": str(e)}), 504
 
-@app.route("/speak", methods=["POST"])
+@app.route("/speak", methods=["GET", "POST"])
 def speak_message():
-    message = request.get_data().decode("utf-8")
-    audio_iterator = client.text_to_speech.convert(
-        voice_id="JBFqnCBsd6RMkjVDRZzb",
-        model_id="eleven_monolingual_v1",
-        text=message
-    )
-    audio_bytes = b"".join([chunk for chunk in audio_iterator])
-    return Response(audio_bytes, mimetype="audio/mpeg", headers={"Content-Disposition": "inline; filename=speech.mp3"})
+    """
+    Speech for a message (POST body, or ?text= so an <audio> element can stream and seek).
+    Cached clips honour Range requests; new ones are streamed while they are synthesized.
+    """
+    if request.method == "GET":
+        message = request.args.get("text", "")
+    else:
+        message = request.get_data().decode("utf-8")
+    if not message:
+        return jsonify({"error": "text is required"}), 400
+
+    headers = {"Content-Disposition": "inline; filename=speech.mp3"}
+    audio_bytes = speech.cached(message)
+    if audio_bytes is not None:
+        response = Response(audio_bytes, mimetype="audio/mpeg", headers=headers)
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(audio_bytes))
+    return Response(speech.stream(message), mimetype="audio/mpeg", headers=headers)
 
 if __name__ == "__main__":
     # Run dev server. In production use a proper WSGI server.
@@ -0,0 +1,352 @@
+"""
+Load test for the Flask endpoints: a live telemetry feed on /get_data plus chat
+(/message) and speech (/speak) traffic, all at once.
+
+Each stream is a number of clients, and each client sends requests on a fixed
+schedule (--hz, --chat-rate, --speak-rate per client) however slowly the server
+answers. Latency is measured from when a request was scheduled, so a server
+that falls behind shows up as growing latency, not as a quietly lower request
+rate. Feed clients are cars, each polling its own /sessions replay; the replay
+runs at --replay-speed so a frame is always due and latency is the server's
+work rather than replay pacing.
+
+By default the backend runs in this process on werkzeug's threaded server with
+the local LLM and TTS stand-ins (LLM_BACKEND=stub, TTS_BACKEND=fake; set
+LLM_STUB_DELAY / TTS_FAKE_DELAY to mimic upstream latency). It then shares the
+interpreter with the load generator, so for numbers that hold on race day pass
+--url to a gunicorn server started with the same variables.
+
+--ramp multiplies the client count of every stream step by step and stops at
+the first step that misses its offered rate, --slo-ms at p99 or
+--max-error-rate. The last step that held is the saturation point.
+
+    python -m benchmarks.load --cars 20 --hz 10 --duration 30
+    python -m benchmarks.load --url http://localhost:5000 --ramp 1 2 4 8 --output load.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import numpy as np
+
+from benchmarks.pipeline import environment, import_backend
+
+DRIVERS = (1, 4, 11, 14, 16, 44, 55, 63, 81)
+QUESTIONS = (
+    "what's the drs of {driver}",
+    "how fast is car {driver} going",
+    "what gear is {driver} in",
+    "is {driver} braking into the next corner",
+    "what's the gap between {driver} and the car ahead",
+    "summarize the last lap of {driver}",
+)
+CALLOUTS = (
+    "Box this lap, box this lap.",
+    "Car {driver} is {gap} seconds behind.",
+    "DRS enabled, push now.",
+    "Gap to the car ahead is {gap}.",
+    "Brake later into turn {turn}.",
+)
+# A step holds if it delivers at least this share of its offered rate
+MIN_THROUGHPUT = 0.95
+
+
+class Target:
+    """
+    Host and port of the server under test. Every client thread keeps its own
+    keep-alive connection, reopened after an error.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+
+    def connect(self) -> http.client.HTTPConnection:
+        kind = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return kind(self.host, self.port, timeout=self.timeout)
+
+    def request(self, conn: http.client.HTTPConnection, method: str, path: str,
+                body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        """
+        Status and the whole body (streamed responses are read to the end). Status 0 on a connection error or timeout.
+        """
+        try:
+            conn.request(method, self.prefix + path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            return 0, b""
+
+
+def start_local_server() -> Tuple[str, Any]:
+    """
+    backend.app on a free local port, with the LLM and TTS stand-ins and a throwaway TTS cache.
+    """
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ.setdefault("TTS_BACKEND", "fake")
+    os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="tts_cache_"))
+    backend = import_backend()
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # one access log line per request drowns the report
+    server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+class FeedClient:
+    """
+    One car: a replay session on /sessions, polled through /get_data. A replay that
+    runs out is replaced by a new one, which does not count as an error.
+    """
+
+    def __init__(self, target: Target, dataset: str, speed: float, frames: int, rng: np.random.Generator):
+        self.target = target
+        self.dataset = dataset
+        self.speed = speed
+        self.frames = frames
+        self.rng = rng
+        self.token: Optional[str] = None
+
+    def _open(self, conn) -> int:
+        body = json.dumps({"dataset": self.dataset, "speed": self.speed, "start": int(self.rng.integers(0, self.frames))})
+        status, payload = self.target.request(conn, "POST", "/sessions", body.encode("utf-8"),
+                                              {"Content-Type": "application/json"})
+        if status == 201:
+            self.token = json.loads(payload)["session"]
+        return status
+
+    def __call__(self, conn) -> int:
+        for _ in range(2):
+            if self.token is None:
+                status = self._open(conn)
+                if status != 201:
+                    return status
+            status, payload = self.target.request(conn, "GET", f"/get_data?session={self.token}")
+            if status != 404 or b"no more data" not in payload:
+                return status
+            self.token = None
+        return status
+
+
+def chat_client(target: Target, rng: np.random.Generator) -> Callable[[Any], int]:
+    def call(conn) -> int:
+        question = QUESTIONS[rng.integers(len(QUESTIONS))].format(driver=DRIVERS[rng.integers(len(DRIVERS))])
+        return target.request(conn, "POST", "/message", question.encode("utf-8"))[0]
+    return call
+
+def speak_client(target: Target, rng: np.random.Generator) -> Callable[[Any], int]:
+    def call(conn) -> int:
+        text = CALLOUTS[rng.integers(len(CALLOUTS))].format(
+            driver=DRIVERS[rng.integers(len(DRIVERS))], gap=round(float(rng.uniform(0.2, 3.0)), 1), turn=rng.integers(1, 20))
+        return target.request(conn, "POST", "/speak", text.encode("utf-8"), {"Content-Type": "text/plain"})[0]
+    return call
+
+
+def run_client(target: Target, call: Callable[[Any], int], rate: float, start: float, stop: float,
+               samples: List[Tuple[float, float, float, int]]) -> None:
+    """
+    Send on a fixed schedule from start until stop, appending (scheduled, sent, done, status).
+    A client that falls behind sends its late requests back to back rather than skipping them.
+    """
+    conn = target.connect()
+    k = 0
+    try:
+        while True:
+            scheduled = start + k / rate
+            if scheduled >= stop or time.perf_counter() >= stop:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            status = call(conn)
+            samples.append((scheduled, sent, time.perf_counter(), status))
+            k += 1
+    finally:
+        conn.close()
+
+def summarize(stream: str, clients: int, rate: float, duration: float, warmup: float, start: float,
+              samples: List[Tuple[float, float, float, int]]) -> Dict[str, Any]:
+    """
+    Throughput, error rate and latency of one stream, leaving out requests scheduled during warmup.
+    Latency runs from the scheduled send time; service time from the actual send.
+    """
+    rows = np.array([s for s in samples if s[0] >= start + warmup], dtype=np.float64).reshape(-1, 4)
+    scheduled, sent, done, status = rows.T
+    ok = (status >= 200) & (status < 400)
+    latency = (done - scheduled) * 1000
+    service = (done - sent) * 1000
+    measured = duration - warmup
+
+    def pct(values, q):
+        return round(float(np.percentile(values, q)), 3) if len(values) else None
+
+    return {
+        "stream": stream,
+        "clients": clients,
+        "offered_rps": round(clients * rate, 2),
+        "achieved_rps": round(float(ok.sum()) / measured, 2),
+        "requests": len(rows),
+        "errors": int((~ok).sum()),
+        "error_rate": round(float((~ok).mean()), 4) if len(rows) else 0.0,
+        "late": round(float(np.mean(sent - scheduled > 1 / rate)), 4) if len(rows) else 0.0,
+        "p50_ms": pct(latency, 50),
+        "p90_ms": pct(latency, 90),
+        "p99_ms": pct(latency, 99),
+        "max_ms": round(float(latency.max()), 3) if len(rows) else None,
+        "service_p50_ms": pct(service, 50),
+        "service_p99_ms": pct(service, 99),
+        "statuses": {str(int(code)): int(n) for code, n in zip(*np.unique(status, return_counts=True))},
+    }
+
+def run_step(target: Target, streams: List[Dict[str, Any]], duration: float, warmup: float, seed: int,
+             replay: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    All streams at once for duration seconds. Clients are staggered across their
+    first interval so they do not fire in lockstep.
+    """
+    start = time.perf_counter() + 0.5
+    stop = start + duration
+    threads, collected = [], []
+    for index, stream in enumerate(streams):
+        samples: List[Tuple[float, float, float, int]] = []
+        collected.append(samples)
+        for client in range(stream["clients"]):
+            rng = np.random.default_rng([seed, index, client])
+            if stream["name"] == "get_data":
+                call = FeedClient(target, replay["dataset"], replay["speed"], replay["frames"], rng)
+            elif stream["name"] == "message":
+                call = chat_client(target, rng)
+            else:
+                call = speak_client(target, rng)
+            phase = client / (stream["clients"] * stream["rate"])
+            threads.append(threading.Thread(target=run_client, args=(target, call, stream["rate"], start + phase, stop, samples),
+                                            daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [summarize(stream["name"], stream["clients"], stream["rate"], duration, warmup, start, samples)
+            for stream, samples in zip(streams, collected)]
+
+def failures(results: List[Dict[str, Any]], slo_ms: float, max_error_rate: float) -> List[str]:
+    """
+    Why a step did not hold, one reason per stream and limit; empty if it held.
+    """
+    reasons = []
+    for result in results:
+        if result["achieved_rps"] < result["offered_rps"] * MIN_THROUGHPUT:
+            reasons.append(f"{result['stream']}: {result['achieved_rps']} of {result['offered_rps']} req/s")
+        if result["p99_ms"] is not None and result["p99_ms"] > slo_ms:
+            reasons.append(f"{result['stream']}: p99 {result['p99_ms']:.0f}ms over {slo_ms:.0f}ms")
+        if result["error_rate"] > max_error_rate:
+            reasons.append(f"{result['stream']}: {result['error_rate']:.1%} errors")
+    return reasons
+
+def replay_options(target: Target, dataset: str, speed: float) -> Dict[str, Any]:
+    """
+    Frame count of the replay dataset, from a probe session that is released straight away.
+    """
+    conn = target.connect()
+    status, payload = target.request(conn, "POST", "/sessions", json.dumps({"dataset": dataset}).encode("utf-8"),
+                                     {"Content-Type": "application/json"})
+    if status != 201:
+        raise SystemExit(f"Could not open a {dataset} replay on the target (status {status}): {payload[:200]!r}")
+    session = json.loads(payload)
+    target.request(conn, "DELETE", f"/sessions/{session['session']}")
+    conn.close()
+    return {"dataset": dataset, "speed": speed, "frames": session["frames"]}
+
+def run(target: Target, cars: int, hz: float, chat_clients: int, chat_rate: float, speak_clients: int, speak_rate: float,
+        scales: List[float], duration: float, warmup: float, slo_ms: float, max_error_rate: float, seed: int,
+        replay: Dict[str, Any]) -> Dict[str, Any]:
+    base = [("get_data", cars, hz), ("message", chat_clients, chat_rate), ("speak", speak_clients, speak_rate)]
+    steps = []
+    saturation = None
+    for scale in scales:
+        streams = [{"name": name, "clients": max(1, round(clients * scale)), "rate": rate}
+                   for name, clients, rate in base if clients > 0 and rate > 0]
+        results = run_step(target, streams, duration, warmup, seed, replay)
+        reasons = failures(results, slo_ms, max_error_rate)
+        steps.append({"scale": scale, "results": results, "held": not reasons, "reasons": reasons})
+
+        print(f"\nscale x{scale:g}")
+        for result in results:
+            print(f"{result['stream']:>9} {result['clients']:>4} clients  {result['offered_rps']:>8.1f} offered  "
+                  f"{result['achieved_rps']:>8.1f} req/s  p50 {result['p50_ms'] or 0:9.2f}ms  p90 {result['p90_ms'] or 0:9.2f}ms  "
+                  f"p99 {result['p99_ms'] or 0:9.2f}ms  {result['error_rate']:6.2%} errors  {result['late']:6.2%} late")
+        if reasons:
+            print("  saturated: " + "; ".join(reasons))
+            saturation = {"held_scale": steps[-2]["scale"] if len(steps) > 1 else None, "failed_scale": scale, "reasons": reasons}
+            break
+
+    if len(scales) > 1:
+        if saturation is None:
+            print(f"\nHeld every step up to x{scales[-1]:g}; ramp further to find the limit")
+        elif saturation["held_scale"] is None:
+            print(f"\nSaturated at the first step (x{scales[0]:g})")
+        else:
+            held = next(step for step in steps if step["scale"] == saturation["held_scale"])
+            total = sum(result["achieved_rps"] for result in held["results"])
+            print(f"\nSaturation between x{saturation['held_scale']:g} and x{saturation['failed_scale']:g}; "
+                  f"last step that held served {total:.1f} req/s")
+    return {"steps": steps, "saturation": saturation}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="server under test; default runs the backend in this process")
+    parser.add_argument("--cars", type=int, default=20, help="feed clients, one /get_data replay each")
+    parser.add_argument("--hz", type=float, default=10.0, help="/get_data polls per second per car")
+    parser.add_argument("--chat-clients", type=int, default=2)
+    parser.add_argument("--chat-rate", type=float, default=0.5, help="/message requests per second per chat client")
+    parser.add_argument("--speak-clients", type=int, default=2)
+    parser.add_argument("--speak-rate", type=float, default=0.5, help="/speak requests per second per speech client")
+    parser.add_argument("--dataset", default="car_data", help="replay dataset the cars poll")
+    parser.add_argument("--replay-speed", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds at the start of each step left out of the results")
+    parser.add_argument("--ramp", type=float, nargs="+", default=[1.0], help="client-count multipliers, one step each")
+    parser.add_argument("--slo-ms", type=float, default=500.0, help="p99 latency a step must stay under")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    if args.warmup >= args.duration:
+        parser.error("--warmup must be shorter than --duration")
+
+    url = args.url
+    if url is None:
+        url, _ = start_local_server()
+    target = Target(url, args.timeout)
+    replay = replay_options(target, args.dataset, args.replay_speed)
+    report = run(target, args.cars, args.hz, args.chat_clients, args.chat_rate, args.speak_clients, args.speak_rate,
+                 args.ramp, args.duration, args.warmup, args.slo_ms, args.max_error_rate, args.seed, replay)
+    report = {
+        "environment": environment(),
+        "params": {"url": args.url or "in-process", "cars": args.cars, "hz": args.hz, "chat_clients": args.chat_clients,
+                   "chat_rate": args.chat_rate, "speak_clients": args.speak_clients, "speak_rate": args.speak_rate,
+                   "replay": replay, "duration": args.duration, "warmup": args.warmup, "slo_ms": args.slo_ms,
+                   "max_error_rate": args.max_error_rate, "seed": args.seed,
+                   "llm_backend": os.getenv("LLM_BACKEND"), "tts_backend": os.getenv("TTS_BACKEND")},
+        **report,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
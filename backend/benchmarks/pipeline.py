@@ -0,0 +1,319 @@
+"""
+Throughput and latency of every stage behind /get_data, at several data sizes.
+
+Inputs are built from one recorded car (data/car_data.json, falling back to
+data/car_data.csv). A lap is one full labelled lap. A session is the whole
+recorded stint. A season is that session repeated once per race weekend, a
+day apart. With --input synthetic, every repeat after the first is driven by
+model.synthetic along the detected track, seeded by --seed, instead of being a
+copy. Whole-array stages are timed over --repeats runs. Per-frame stages
+(preprocess_frame, preprocess_row, single-row predict, suggestions, the
+/get_data handler) are timed call by call over --frames frames.
+
+    python -m benchmarks.pipeline --sizes lap session season --output bench.json
+    python -m benchmarks.pipeline --baseline bench.json --max-regression 0.2
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+from model import artifacts, track_util
+from model.numpy_mlp import NumpyMLP, NumpySuggestionEngine
+from model.preprocess import FRAME_FIELDS, preprocess_frame, preprocess_frames, preprocess_row
+from model.synthetic import iter_car
+from model.telemetry_store import TelemetryStore, from_micros, load_telemetry
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SOURCE = BACKEND_DIR / "data" / "car_data.json"
+if not DEFAULT_SOURCE.exists():
+    DEFAULT_SOURCE = BACKEND_DIR / "data" / "car_data.csv"
+RACES_PER_SEASON = 24
+SIZES = ("lap", "session", "season")
+SUGGESTION_FEATURES = range(4)  # throttle, brake, speed, rpm, as in backend.py
+LAP_SECONDS = (60.0, 200.0)  # a racing lap of any current circuit takes this long
+
+
+def load_records(source: Path) -> List[Dict[str, Any]]:
+    if Path(source).suffix == ".json":
+        return track_util.load_car_data(str(source))
+    return load_telemetry(str(source)).to_records()
+
+def one_driver(records: List[Dict[str, Any]], driver: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Records of one car: driver, or the driver_number most records carry.
+    """
+    if driver is None:
+        numbers, counts = np.unique([car["driver_number"] for car in records], return_counts=True)
+        driver = int(numbers[counts.argmax()])
+    return [car for car in records if car["driver_number"] == driver]
+
+def check_lap(lap: List[Dict[str, Any]]) -> None:
+    """
+    Refuse a benchmark lap that cannot be a real one: too short or long, or not going
+    round the track. Misaligned columns or several cars mixed together end up here.
+    """
+    micros = track_util.parse_timestamps(lap)
+    seconds = (int(micros[-1]) - int(micros[0])) / 1e6 if len(lap) else 0.0
+    percent = np.array([car["track_percent"] for car in lap])
+    covered = float(np.ptp(percent)) if len(lap) else 0.0
+    if not LAP_SECONDS[0] <= seconds <= LAP_SECONDS[1] or covered < 0.9:
+        raise ValueError(f"Lap input is {len(lap)} rows over {seconds:.0f}s covering {covered:.0%} of the track; "
+                         "check that the source is one car with aligned columns")
+
+def repeat_session(session: List[Dict[str, Any]], copies: int, synthetic: bool, seed: int = 0,
+                   corner_points=None, laps: int = 1) -> List[Dict[str, Any]]:
+    """
+    copies of the session, each a day after the previous one. With synthetic, every copy
+    after the first is generated by model.synthetic instead: the given number of laps
+    driven along corner_points.
+    """
+    micros = track_util.parse_timestamps(session)
+    records = []
+    for race in range(copies):
+        shift = race * 86_400 * 1_000_000
+        if synthetic and race:
+            first = session[0]
+            records.extend(iter_car(corner_points, first["session_key"], first["driver_number"], laps, seed + race,
+                                    start=from_micros(int(micros[0]) + shift), meeting_key=first["meeting_key"]))
+            continue
+        records.extend(dict(car, date=from_micros(int(at) + shift)) for car, at in zip(session, micros))
+    return records
+
+def build_inputs(source: Path, sizes, synthetic: bool, seed: int = 0, driver: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Cleaned (unlabelled) car records of one driver for each size.
+    """
+    session = track_util.preprocess_car_data(one_driver(load_records(source), driver))
+    if len(session) < 2:
+        raise ValueError(f"{len(session)} usable rows for the driver in {source}; "
+                         "check that the source is one car with aligned columns")
+    corner_points = track_util.get_corner_points(session)
+    labelled = copy.deepcopy(session)
+    track_util.assign_percent_per_second(labelled, corner_points)
+    laps = np.array([car["lap"] for car in labelled])
+    # The second lap is the first one that is complete at both ends
+    in_lap = laps == min(2, laps.max())
+    check_lap([car for car, keep in zip(labelled, in_lap) if keep])
+    lap = [car for car, keep in zip(session, in_lap) if keep]
+    inputs = {"lap": lap, "session": session}
+    if "season" in sizes:
+        inputs["season"] = repeat_session(session, RACES_PER_SEASON, synthetic, seed, corner_points, int(laps.max()))
+    return {size: inputs[size] for size in sizes}
+
+def summarize(stage: str, size: str, rows: int, latencies: List[float], rows_per_call: int = 1) -> Dict[str, Any]:
+    latencies = np.asarray(latencies)
+    return {
+        "stage": stage,
+        "size": size,
+        "rows": rows,
+        "calls": len(latencies),
+        "mean_ms": round(float(latencies.mean()) * 1000, 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 4),
+        "p90_ms": round(float(np.percentile(latencies, 90)) * 1000, 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 4),
+        "rows_per_s": round(rows_per_call * len(latencies) / float(latencies.sum()), 1),
+    }
+
+def time_calls(fn: Callable[[Any], Any], args: List[Any]) -> List[float]:
+    latencies = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def time_repeats(fn: Callable[[], Any], repeats: int, setup: Optional[Callable[[], Any]] = None) -> List[float]:
+    latencies = []
+    for _ in range(repeats):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def bench_size(size: str, records: List[Dict[str, Any]], model, engine, repeats: int, frames: int, rng) -> List[Dict[str, Any]]:
+    results = []
+    n = len(records)
+    # Corner detection stops once it has closed the loop, so its cost follows the lap, not the input
+    corner_points = track_util.get_corner_points(records)
+    results.append(summarize("get_corner_points", size, n, time_repeats(lambda: track_util.get_corner_points(records), repeats),
+                             rows_per_call=n))
+    results.append(summarize("assign_percent_per_second", size, n, time_repeats(
+        lambda cars: track_util.assign_percent_per_second(cars, corner_points), repeats,
+        setup=lambda: [dict(car) for car in records]), rows_per_call=n))
+
+    labelled = [dict(car) for car in records]
+    track_util.assign_percent_per_second(labelled, corner_points)
+    store = TelemetryStore.from_records(labelled)
+    picks = rng.integers(0, n, min(frames, n))
+    sample = [labelled[i] for i in picks]
+
+    # preprocess_frame stays as the reference the batched path must reproduce bit for bit
+    block = {name: [car[name] for car in sample] for name in FRAME_FIELDS}
+    assert np.array_equal(preprocess_frames(block), np.stack([preprocess_frame(car) for car in sample])), \
+        "preprocess_frames differs from preprocess_frame"
+    results.append(summarize("preprocess_frame", size, len(sample), time_calls(preprocess_frame, sample)))
+    # The one-row batched call annotate_frame makes per served frame
+    results.append(summarize("preprocess_row", size, len(sample), time_calls(preprocess_row, sample)))
+    results.append(summarize("preprocess_frames", size, n, time_repeats(lambda: preprocess_frames(store), repeats), rows_per_call=n))
+
+    features = preprocess_frames(store).astype(np.float32)
+    rows = features[picks]
+    results.append(summarize("predict_row", size, len(rows), time_calls(model.predict, list(rows))))
+    results.append(summarize("predict_batch", size, n, time_repeats(lambda: model.predict(features), repeats), rows_per_call=n))
+
+    # The per-frame suggestion (100 ascent steps) as one /get_data call runs it, then full 64-row batches
+    some = list(rows[:max(1, frames // 10)])
+    results.append(summarize("optimize_input", size, len(some), time_calls(lambda row: engine.optimize(row[None, :]), some)))
+    batches = [rows[i:i + 64] for i in range(0, len(rows) - 63, 64)][:max(1, frames // 100)]
+    if batches:
+        results.append(summarize("optimize_batch64", size, 64 * len(batches),
+                                 time_calls(engine.optimize, batches), rows_per_call=64))
+    return results
+
+def import_backend():
+    """
+    backend.py, imported from its own directory as the server runs it.
+    """
+    sys.path.insert(0, str(BACKEND_DIR))
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)
+    try:
+        import backend
+    finally:
+        os.chdir(cwd)
+    return backend
+
+def bench_get_data(frames: int, rng) -> List[Dict[str, Any]]:
+    """
+    The whole /get_data handler through Flask's test client, pacing excluded: each
+    request gets a fresh session positioned on a frame that is already due.
+    """
+    backend = import_backend()
+    client = backend.app.test_client()
+    total = len(backend.replay_sessions.datasets["car_data"])
+    tokens = [backend.replay_sessions.create("car_data", start=int(i))[0] for i in rng.integers(0, total, min(frames, total))]
+    errors = 0
+
+    def request(token):
+        nonlocal errors
+        response = client.get(f"/get_data?session={token}")
+        errors += response.status_code != 200
+
+    latencies = time_calls(request, tokens)
+    for token in tokens:
+        backend.replay_sessions.release(token)
+    result = summarize("get_data", "frame", len(tokens), latencies)
+    result["errors"] = errors
+    return [result]
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+def load_engine(backend: str):
+    """
+    Model and suggestion engine as backend.py builds them for MODEL_BACKEND=backend.
+    """
+    path = artifacts.resolve_model_path(str(BACKEND_DIR / "model" / "model.keras"))
+    if backend == "keras":
+        from keras.models import load_model
+        import model.gradientAscent as gradient_ascent
+        model = load_model(path)
+        return model, gradient_ascent.SuggestionEngine(model, trainable_features=SUGGESTION_FEATURES)
+    model = NumpyMLP.from_keras(path)
+    return model, NumpySuggestionEngine(model, trainable_features=SUGGESTION_FEATURES)
+
+def run(sizes, source: Path, synthetic: bool, repeats: int, frames: int, seed: int, handler: bool,
+        backend: str = "numpy", driver: Optional[int] = None) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    model, engine = load_engine(backend)
+    inputs = build_inputs(source, sizes, synthetic, seed, driver)
+
+    results = []
+    for size, records in inputs.items():
+        for result in bench_size(size, records, model, engine, repeats, frames, rng):
+            results.append(result)
+            print(f"{result['stage']:>26} {size:>8} {result['rows']:>8} rows  p50 {result['p50_ms']:10.4f}ms  "
+                  f"p99 {result['p99_ms']:10.4f}ms  {result['rows_per_s']:>12} rows/s")
+    if handler:
+        try:
+            results.extend(bench_get_data(frames, rng))
+            print(f"{'get_data':>26} {'frame':>8}  p50 {results[-1]['p50_ms']:10.4f}ms  p99 {results[-1]['p99_ms']:10.4f}ms  "
+                  f"{results[-1]['errors']} errors")
+        except ImportError as e:
+            print(f"Skipping /get_data: backend could not be imported ({e})")
+
+    return {
+        "environment": environment(),
+        "params": {"source": str(source), "input": "synthetic" if synthetic else "recorded", "model_backend": backend, "repeats": repeats,
+                   "driver": driver, "frames": frames, "seed": seed, "rows": {size: len(records) for size, records in inputs.items()}},
+        "results": results,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """
+    Print p50 and throughput changes against a previous run; returns the regressed (stage, size) names.
+    """
+    before = {(r["stage"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'stage':>26} {'size':>8} {'p50 before':>12} {'p50 now':>12} {'change':>8}")
+    for result in current["results"]:
+        old = before.get((result["stage"], result["size"]))
+        if old is None or not old["p50_ms"]:
+            continue
+        change = result["p50_ms"] / old["p50_ms"] - 1
+        flag = "  REGRESSION" if change > max_regression else ""
+        print(f"{result['stage']:>26} {result['size']:>8} {old['p50_ms']:12.4f} {result['p50_ms']:12.4f} {change:+8.1%}{flag}")
+        if flag:
+            regressions.append(f"{result['stage']}/{result['size']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=SIZES)
+    parser.add_argument("--source", default=str(DEFAULT_SOURCE), help="recorded car data (JSON or CSV)")
+    parser.add_argument("--driver", type=int, help="driver_number to benchmark (default: the one with most rows)")
+    parser.add_argument("--input", choices=["recorded", "synthetic"], default="recorded")
+    parser.add_argument("--model-backend", choices=["numpy", "keras"], default=os.getenv("MODEL_BACKEND", "numpy"))
+    parser.add_argument("--repeats", type=int, default=5, help="runs of each whole-array stage")
+    parser.add_argument("--frames", type=int, default=1000, help="frames timed one by one for per-frame stages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-handler", action="store_true", help="skip the /get_data handler (needs the full backend)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="p50 slowdown that fails the comparison")
+    args = parser.parse_args()
+
+    report = run(args.sizes, Path(args.source), args.input == "synthetic", args.repeats, args.frames, args.seed,
+                 handler=not args.no_handler, backend=args.model_backend, driver=args.driver)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
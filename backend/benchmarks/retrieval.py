@@ -0,0 +1,137 @@
+"""
+Recall/latency benchmark for the /message retriever's index types.
+
+For each corpus size, every configured index type is built over the same
+telemetry rows and queried with the same held-out rows. Recall@k is measured
+against the exact flat index; latency is per single query, as /message issues them.
+
+    python -m benchmarks.retrieval --sizes 10000 50000 200000 --k 5 --output retrieval.json
+
+--check-persistence instead saves each index type to a scratch directory and
+checks that rows added before and after a reload survive, without a rebuild.
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+from model.telemetry_store import TelemetryStore, load_telemetry
+from retrieval import INDEX_NAME, TelemetryIndex, embed_texts, index_config, row_text
+
+DEFAULT_SOURCE = Path(__file__).resolve().parent.parent / "data" / "car_data.csv"
+
+
+def synthetic_corpus(base: TelemetryStore, size: int, seed: int = 0) -> TelemetryStore:
+    """
+    Tile the recorded rows up to `size`, jittering the numeric channels so rows stay distinct.
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(base), size)
+    columns = {}
+    for name, col in base.columns.items():
+        col = np.asarray(col)[picks]
+        if name in ("speed", "throttle", "rpm"):
+            col = np.clip(col + rng.integers(-3, 4, size), 0, None).astype(col.dtype)
+        elif name in ("x", "y", "z"):
+            col = col + rng.normal(0, 5, size)
+        columns[name] = col
+    columns["driver_number"] = rng.choice([1, 4, 11, 14, 16, 44, 55, 63, 81], size).astype(np.int16)
+    columns["lap"] = rng.integers(1, 58, size).astype(np.int16)
+    return TelemetryStore(columns)
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000.0)
+
+def run(sizes, kinds, k, n_queries, source):
+    base = load_telemetry(str(source))
+    results = []
+    for size in sizes:
+        corpus = synthetic_corpus(base, size)
+        queries = embed_texts([row_text(row) for row in synthetic_corpus(base, n_queries, seed=1)])
+
+        exact = None
+        for kind in ["flat"] + [kind for kind in kinds if kind != "flat"]:
+            config = {**index_config(), "type": kind}
+            start = time.perf_counter()
+            index = TelemetryIndex.build(corpus, config)
+            build_time = time.perf_counter() - start
+
+            latencies = []
+            found = []
+            for query in queries:
+                start = time.perf_counter()
+                hits = index.search_vectors(query[None, :], k)[0]
+                latencies.append(time.perf_counter() - start)
+                found.append({idx for idx, _ in hits})
+            if kind == "flat":
+                exact = found
+
+            recall = float(np.mean([len(f & e) / max(len(e), 1) for f, e in zip(found, exact)]))
+            result = {
+                "rows": size,
+                "index": kind,
+                "k": k,
+                "build_s": round(build_time, 3),
+                "recall_at_k": round(recall, 4),
+                "p50_ms": round(percentile_ms(latencies, 50), 4),
+                "p99_ms": round(percentile_ms(latencies, 99), 4),
+            }
+            results.append(result)
+            if kind in kinds:
+                print(f"{size:>9} {kind:>5}  build {result['build_s']:8.2f}s  recall@{k} {recall:.3f}  "
+                      f"p50 {result['p50_ms']:8.3f}ms  p99 {result['p99_ms']:8.3f}ms")
+    return [result for result in results if result["index"] in kinds]
+
+def check_persistence(kinds, source, rows: int = 2000, added: int = 20) -> None:
+    """
+    Build, add, reload, add and reload again for each index type. Every appended
+    row must survive both reloads and be found again, and the saved base index
+    must never be rebuilt.
+    """
+    base = load_telemetry(str(source))
+    corpus = synthetic_corpus(base, rows)
+    extra = synthetic_corpus(base, added, seed=2)[:added]
+    half = added // 2
+    for kind in kinds:
+        config = {**index_config(), "type": kind}
+        with tempfile.TemporaryDirectory() as scratch:
+            directory = Path(scratch)
+            index = TelemetryIndex.load_or_build(corpus, None, directory, config)
+            built_at = (directory / INDEX_NAME).stat().st_mtime_ns
+            index.add(extra[:half])
+            index = TelemetryIndex.load_or_build(corpus, None, directory, config)
+            assert len(index) == rows + half, f"{kind}: {len(index)} rows after the first reload"
+            index.add(extra[half:])
+            index = TelemetryIndex.load_or_build(corpus, None, directory, config)
+            assert len(index) == rows + added, f"{kind}: {len(index)} rows after the second reload"
+            assert index.index.ntotal == rows + added, f"{kind}: {index.index.ntotal} vectors indexed"
+            assert (directory / INDEX_NAME).stat().st_mtime_ns == built_at, f"{kind}: index was rebuilt"
+            for offset, row in enumerate(extra):
+                assert index.row(rows + offset) == row, f"{kind}: appended row {offset} changed"
+                hits = index.search(row_text(row), k=1)
+                assert hits and hits[0][1] < 1e-6, f"{kind}: appended row {offset} not found"
+        print(f"{kind:>5}  {rows} rows + {half} added + reload + {added - half} added + reload: ok")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--index", nargs="+", default=["flat", "ivf", "hnsw"], choices=["flat", "ivf", "hnsw"])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--source", default=str(DEFAULT_SOURCE))
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--check-persistence", action="store_true", help="check save/add/reload round trips and exit")
+    args = parser.parse_args()
+
+    if args.check_persistence:
+        check_persistence(args.index, args.source)
+        return
+    results = run(args.sizes, args.index, args.k, args.queries, args.source)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ with open('car_data.csv', 'w', newline='') as csv_file:
    # Write the header (keys of the JSON objects)
    header = data[0].keys()
    writer.writerow(header)
-   # Write the rows (values of the JSON objects)
+   # Write the rows (values of the JSON objects), in header order: key order varies between records
    for row in data:
-       writer.writerow(row.values())
+       writer.writerow([row.get(key) for key in header])
 print("JSON has been successfully converted to CSV!")
\ No newline at end of file
@@ -1,58 +1,65 @@
 import os
-import json # Used for loading and dumping JSON
-import glob # Used for finding your .json files
-from google import generativeai as genai
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
+from llm import LLMClient, LLMTimeout, make_model
+from model.lap_summary import LapSummary, format_rows, summarize_file
 
 # --- Configuration ---
 load_dotenv()
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
-# --- 1. Load All JSON Files on Startup ---
-def load_json_data(data_directory="data"):
+# --- 1. Summarize the Telemetry on Startup ---
+def load_lap_summary(data_directory="data"):
     """
-    Finds all .json files in the specified directory,
-    loads them, and returns them as a single JSON string.
+    Per-lap and per-sector aggregates of the session telemetry.
+    Prompts quote a few of these rows instead of dumping raw JSON.
     """
-    all_data = []
-    # Use glob to find all files ending in .json in the /data/ folder
-    json_files = glob.glob(os.path.join(data_directory, "*.json"))
-    
-    if not json_files:
-        print(f"Warning: No .json files found in '{data_directory}' directory.")
-        return "{}" # Return empty JSON object as a string
-        
-    print(f"Loading files: {json_files}")
-    
-    for file_path in json_files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    all_data.extend(data[:100])  # If the JSON is a list, extend the main list
-                else:
-                    all_data.append(data)
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-            
-    # Convert the combined list of Python objects into a single JSON string
-    # 'indent=2' makes it nicely formatted, which can help the model read it.
-    return json.dumps(all_data, indent=2)
+    data_path = os.path.join(data_directory, "car_data.json")
+    if not os.path.exists(data_path):
+        data_path = os.path.join(data_directory, "car_data.csv")
+    try:
+        return summarize_file(data_path)
+    except Exception as e:
+        print(f"Error loading {data_path}: {e}")
+        return LapSummary()
 
-# Load the data when the server starts and store it in a variable
-YOUR_PROJECT_DATA = load_json_data()
+# Build the tables when the server starts and store them in a variable
+LAP_SUMMARY = load_lap_summary()
 
 # --- Initialize Gemini ---
 try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel('gemini-2.5-flash')
+    model = make_model('gemini-2.5-flash')
+    # Repeated and concurrent duplicate questions share one upstream call
+    llm = LLMClient.from_env(model)
 except Exception as e:
     print(f"Error configuring Gemini: {e}")
     model = None
 
+# --- 2. Updated & Stricter RAG Prompt ---
+def build_prompt(question):
+    # Only the laps and sectors the question is about, as a compact table
+    summary = format_rows(LAP_SUMMARY.relevant_rows(question))
+    return f"""
+    You are a helpful assistant. Your knowledge is strictly limited 
+    to the following lap and sector summary table. You must answer the 
+    user's question based *only* on this data. Speeds are km/h, drs_pct 
+    is the share of samples with DRS open and lap_time is in seconds. 
+    
+    If the answer is not contained within this table, you MUST 
+    say "I do not have that information." 
+    
+    Do not use any external knowledge.
+
+    Lap Summary:
+    ---
+    {summary}
+    ---
+
+    Question: {question}
+    """
+
 # --- API Endpoint ---
 @app.route('/api/ask', methods=['POST'])
 def ask_gemini():
@@ -66,30 +73,14 @@ def ask_gemini():
         if not question:
             return jsonify({"error": "Question is required"}), 400
 
-        # --- 2. Updated & Stricter RAG Prompt ---
-        prompt = f"""
-        You are a helpful assistant. Your knowledge is strictly limited 
-        to the following JSON data. You must answer the user's question 
-        based *only* on this data. 
-        
-        If the answer is not contained within this JSON, you MUST 
-        say "I do not have that information." 
-        
-        Do not use any external knowledge.
-
-        JSON Data:
-        ---
-        {YOUR_PROJECT_DATA}
-        ---
-
-        Question: {question}
-        """
-
-        # --- Send to Gemini ---
-        response = model.generate_content(prompt)
+        # --- Send to Gemini (or answer from the cache) ---
+        answer = llm.ask(question, build_prompt, data_version=LAP_SUMMARY.version)
         
-        return jsonify({"answer": response.text})
+        return jsonify({"answer": answer})
 
+    except LLMTimeout as e:
+        print(f"Gemini timed out: {e}")
+        return jsonify({"error": "Gemini took too long to answer"}), 504
     except Exception as e:
         print(f"Error during API call: {e}")
         return jsonify({"error": "Failed to get answer from Gemini"}), 500
@@ -1,8 +1,9 @@
-import model.track_util as util
+import model.track_cache as track_cache
 import json
 import random
 
-cars, corner_points = util.get_track_info(None)
+cars, corner_points = track_cache.load_track_info(None)
+cars = cars.to_records()
 for car in cars:
     base_rankings = [
         {"position": 1, "name": "Fax Veryappen", "time": "1:30.123"},
@@ -0,0 +1,144 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_TTL = 24 * 60 * 60  # seconds, for responses that may still change
+_USE_DEFAULT = object()
+
+
+class CacheEntry:
+    def __init__(self, body: bytes, meta: Dict[str, Any]):
+        self.body = body
+        self.meta = meta
+
+    @property
+    def fresh(self) -> bool:
+        expires_at = self.meta.get("expires_at")
+        return expires_at is None or time.time() < expires_at
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def validators(self) -> Dict[str, str]:
+        """
+        Headers for a conditional re-request of this entry.
+        """
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+
+class ResponseCache:
+    """
+    On-disk cache of API responses addressed by a hash of (url, params).
+    Each entry is a body file plus a metadata file written after it, so an
+    interrupted download never leaves a usable half-entry. Total size is kept
+    under max_bytes by evicting the least recently used entries.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, default_ttl: Optional[float] = DEFAULT_TTL):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self.directory.glob("*/*") if path.is_file())
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        canonical = json.dumps({"url": url, "params": params or {}}, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        folder = self.directory / key[:2]
+        return folder / f"{key}.body", folder / f"{key}.meta.json"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        The stored entry, fresh or stale, or None. Only fresh entries count as hits.
+        """
+        body_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if len(body) != meta.get("size"):
+            self.misses += 1
+            return None
+        now = time.time()
+        os.utime(meta_path, (now, now))  # mark as recently used for eviction
+        entry = CacheEntry(body, meta)
+        # A stale entry is still returned for revalidation, but it needs a request, so it is a miss
+        if entry.fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def put(self, key: str, body: bytes, ttl: Optional[float] = _USE_DEFAULT, **meta: Any) -> None:
+        """
+        Store a response body. ttl=None keeps it forever; the default uses default_ttl.
+        Extra keyword arguments (etag, last_modified, url...) are saved as metadata.
+        """
+        if ttl is _USE_DEFAULT:
+            ttl = self.default_ttl
+        body_path, meta_path = self._paths(key)
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            **meta,
+            "size": len(body),
+            "stored_at": time.time(),
+            "expires_at": None if ttl is None else time.time() + ttl,
+        }
+        old_size = self._entry_size(body_path, meta_path)
+
+        tmp = body_path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+        tmp.write_bytes(body)
+        os.replace(tmp, body_path)
+        tmp = meta_path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, meta_path)
+
+        with self._lock:
+            self._size += self._entry_size(body_path, meta_path) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def refresh(self, key: str, entry: CacheEntry, ttl: Optional[float] = _USE_DEFAULT) -> None:
+        """
+        Extend an entry's lifetime after the server confirmed it is unchanged (304).
+        """
+        meta = {name: value for name, value in entry.meta.items() if name not in ("size", "stored_at", "expires_at")}
+        self.put(key, entry.body, ttl=ttl, **meta)
+
+    @staticmethod
+    def _entry_size(*paths: Path) -> int:
+        return sum(path.stat().st_size for path in paths if path.exists())
+
+    def _evict(self) -> None:
+        # Least recently used first, judged by the metadata file's mtime
+        entries = sorted(self.directory.glob("*/*.meta.json"), key=lambda path: path.stat().st_mtime)
+        for meta_path in entries:
+            if self._size <= self.max_bytes:
+                break
+            body_path = meta_path.with_name(meta_path.name.replace(".meta.json", ".body"))
+            size = self._entry_size(body_path, meta_path)
+            for path in (meta_path, body_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self._size -= size
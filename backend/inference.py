@@ -0,0 +1,77 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+
+class BatchPredictor:
+    """
+    Collects feature rows submitted by many request threads (one per car/session)
+    and runs them through the model as a single matrix. Each caller gets back a
+    future resolving to its own row of the output.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], max_batch_size: int = 64, max_wait: float = 0.005):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait  # seconds to wait for more frames once one is pending
+
+        self._pending: List[Tuple[np.ndarray, Future]] = []
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="batch-predictor", daemon=True)
+        self._worker.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Rows waiting for the next batch.
+        """
+        return len(self._pending)
+
+    def submit(self, features: np.ndarray) -> Future:
+        """
+        Queue one feature row for the next batch and return a future for its prediction.
+        """
+        future = Future()
+        with self._cond:
+            self._pending.append((np.asarray(features, dtype=np.float32), future))
+            self._cond.notify()
+        return future
+
+    def predict(self, features: np.ndarray) -> float:
+        """
+        Blocking single-frame prediction that shares a batch with concurrent callers.
+        """
+        return float(self.submit(features).result())
+
+    def predict_many(self, features: np.ndarray) -> np.ndarray:
+        """
+        Predict a whole block of frames (e.g. every car on the grid) at once.
+        """
+        futures = [self.submit(row) for row in np.asarray(features)]
+        return np.array([f.result() for f in futures], dtype=np.float32)
+
+    def _take_batch(self) -> List[Tuple[np.ndarray, Future]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Give other cars a moment to join this batch, unless it is already full
+            if len(self._pending) < self.max_batch_size:
+                self._cond.wait_for(lambda: len(self._pending) >= self.max_batch_size, timeout=self.max_wait)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            try:
+                outputs = self.predict_fn(np.stack([features for features, _ in batch]))
+                outputs = np.asarray(outputs).reshape(len(batch), -1)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output[0] if output.shape[0] == 1 else output)
@@ -0,0 +1,205 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import ResponseCache
+from model.track_util import parse_timestamps
+
+API_URL = "https://api.openf1.org/v1"
+CHUNK_MINUTES = 120
+CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join(os.path.dirname(__file__), "data", "http_cache"))
+SETTLE_SECONDS = 10 * 60  # data older than this is assumed final and cached forever
+
+Request = Tuple[str, Dict[str, Any]]
+
+
+class Session:
+    """
+    One OpenF1 session. Requests share a pooled HTTP session and run on a bounded
+    thread pool, so time chunks, endpoints and drivers are all fetched concurrently.
+    """
+
+    def __init__(self, session_key, default_driver=55, base_url: str = API_URL, max_workers: int = 8, timeout: float = 30,
+                 chunk_minutes: int = CHUNK_MINUTES, cache: ResponseCache = None):
+        self.session_key = session_key
+        self.default_driver = default_driver
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.chunk_minutes = chunk_minutes
+        # Completed chunks are reused from disk, so a re-run resumes where the last one stopped
+        self.cache = cache
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+        sessions, bounds = self.fetch_many([
+            ("sessions", {}),
+            ("car_data", {"driver_number": default_driver, "speed": 0}),
+        ])
+        self.session_data = sessions[0]
+        self.session_start = datetime.fromisoformat(bounds[0]["date"])
+        self.session_end = datetime.fromisoformat(bounds[-1]["date"])
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False)
+        self.http.close()
+
+    def fetch(self, path, params: dict = None):
+        url = f"{self.base_url}/{path}"
+        params = {**(params or {}), "session_key": self.session_key}
+        if self.cache is None:
+            response = self.http.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+
+        key = self.cache.key(url, params)
+        entry = self.cache.get(key)
+        if entry is not None and entry.fresh:
+            return entry.json()
+
+        response = self.http.get(url, params=params, timeout=self.timeout, headers=entry.validators() if entry else None)
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(key, entry, ttl=self.cache_ttl(params))
+            return entry.json()
+        response.raise_for_status()
+        self.cache.put(
+            key, response.content, ttl=self.cache_ttl(params), url=url, params=params,
+            etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+        )
+        return response.json()
+
+    def cache_ttl(self, params: dict):
+        """
+        Chunks that ended well in the past never change, so they are kept forever;
+        a chunk that may still be filling is revalidated on every run.
+        """
+        end = params.get("date<")
+        if end is None:
+            return self.cache.default_ttl
+        end = datetime.fromisoformat(end)
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        if (datetime.now(timezone.utc) - end).total_seconds() > SETTLE_SECONDS:
+            return None
+        return 0
+
+    def fetch_many(self, requests_: Iterable[Request]) -> List[Any]:
+        """
+        Run many (path, params) requests on the pool; results come back in request order.
+        """
+        return list(self.pool.map(lambda request: self.fetch(*request), list(requests_)))
+
+    def interval_params(self, start: datetime, end: datetime, params: dict = None) -> dict:
+        # Half-open intervals so consecutive chunks neither overlap nor drop boundary rows
+        return {"date>=": start.isoformat(), "date<": end.isoformat(), **(params or {})}
+
+    def fetch_interval(self, path, start: datetime, end: datetime, params: dict = None):
+        return self.fetch(path, self.interval_params(start, end, params))
+
+    def chunk_requests(self, path, params: dict = None) -> List[Request]:
+        """
+        Split the whole session into (path, params) requests of at most chunk_minutes each.
+        """
+        chunks = []
+        timestamp = self.session_start
+        # The last chunk is closed at the session end by nudging it 1 µs past it
+        end = self.session_end + timedelta(microseconds=1)
+        while timestamp < end:
+            chunk_end = min(timestamp + timedelta(minutes=self.chunk_minutes), end)
+            chunks.append((path, self.interval_params(timestamp, chunk_end, params)))
+            timestamp = chunk_end
+        return chunks
+
+    def fetch_all(self, path, params: dict = None):
+        all_data = []
+        for chunk_data in self.fetch_many(self.chunk_requests(path, params)):
+            all_data.extend(chunk_data)
+        return all_data
+
+    def fetch_drivers(self, drivers: Iterable[int], endpoints: Tuple[str, ...] = ("car_data", "location")) -> Dict[int, Dict[str, list]]:
+        """
+        Fetch every endpoint for every driver across the whole session in one batch of requests.
+        Returns {driver: {endpoint: rows}}.
+        """
+        plan = []
+        requests_ = []
+        for driver in drivers:
+            for endpoint in endpoints:
+                chunks = self.chunk_requests(endpoint, {"driver_number": driver})
+                plan.append((driver, endpoint, len(chunks)))
+                requests_.extend(chunks)
+
+        results = iter(self.fetch_many(requests_))
+        data = {}
+        for driver, endpoint, n_chunks in plan:
+            rows = []
+            for _ in range(n_chunks):
+                rows.extend(next(results))
+            data.setdefault(driver, {})[endpoint] = rows
+        return data
+
+
+def interpolate_locations(car_data: List[Dict[str, Any]], locations: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Position of the car at each car_data timestamp, linearly interpolated between the
+    surrounding location samples. Returns an (N, 3) array of x, y, z.
+    """
+    if not car_data:
+        return np.zeros((0, 3))
+    if not locations:
+        return np.zeros((len(car_data), 3))
+
+    car_times = parse_timestamps(car_data)
+    loc_times = parse_timestamps(locations)
+    loc_pos = np.array([(loc["x"], loc["y"], loc["z"]) for loc in locations], dtype=np.float64)
+
+    if len(locations) == 1:
+        return np.repeat(loc_pos, len(car_data), axis=0)
+
+    # First location at or after each car sample, clamped to the recorded range
+    upper = np.clip(np.searchsorted(loc_times, car_times, side="left"), 1, len(locations) - 1)
+    lower = upper - 1
+    span = (loc_times[upper] - loc_times[lower]).astype(np.float64)
+    frac = np.zeros(len(car_times))
+    np.divide(car_times - loc_times[lower], span, out=frac, where=span > 0)
+    frac = np.clip(frac, 0.0, 1.0)[:, None]
+    return loc_pos[lower] + (loc_pos[upper] - loc_pos[lower]) * frac
+
+def merge_locations(car_data: List[Dict[str, Any]], locations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Write interpolated x, y, z into each car_data row in place.
+    """
+    positions = interpolate_locations(car_data, locations)
+    for entry, (x, y, z) in zip(car_data, positions.tolist()):
+        entry["x"], entry["y"], entry["z"] = x, y, z
+    return car_data
+
+def ingest_session(session: Session, drivers: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    car_data with merged positions for each driver in the session.
+    """
+    fetched = session.fetch_drivers(drivers)
+    return {driver: merge_locations(data["car_data"], data["location"]) for driver, data in fetched.items()}
+
+def save_session(session: Session, drivers: Iterable[int], directory: str) -> List[str]:
+    """
+    Write each driver's merged car_data to <directory>/<session_key>/<driver>.json,
+    the layout race.RaceRegistry loads. Returns the written paths.
+    """
+    folder = os.path.join(directory, str(session.session_key))
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for driver, car_data in ingest_session(session, drivers).items():
+        path = os.path.join(folder, f"{driver}.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(car_data, fh)
+        paths.append(path)
+    return paths
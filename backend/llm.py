@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import metrics
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 10 * 60  # seconds
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 30  # seconds
+
+
+class LLMTimeout(TimeoutError):
+    pass
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """
+    Local stand-in for a GenerativeModel: answers instantly (or after delay seconds)
+    with a deterministic echo of the prompt, and counts its calls.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents: str, **_: Any) -> StubResponse:
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        digest = hashlib.sha256(contents.encode("utf-8")).hexdigest()[:8]
+        return StubResponse(f"[stub {digest}] {' '.join(contents.split())[:80]}")
+
+
+def make_model(name: str):
+    """
+    The Gemini model of that name, or StubModel when LLM_BACKEND=stub (tests, load runs, no API key).
+    """
+    if os.getenv("LLM_BACKEND", "gemini").lower() == "stub":
+        return StubModel(delay=float(os.getenv("LLM_STUB_DELAY", "0")))
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(name)
+
+
+def normalize(text: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a question, so trivially different
+    phrasings ("What's my DRS?" / "what's my drs ?") share a cache entry.
+    """
+    return " ".join(re.sub(r"\s*([?!.,])", r"\1", text).lower().split()).rstrip("?!. ")
+
+
+class LLMClient:
+    """
+    Call layer in front of generate_content. Answers are cached (LRU with a TTL)
+    under the normalized question plus a data version, concurrent identical
+    questions share one upstream call, and at most max_concurrency calls run at
+    once, each bounded by timeout.
+    """
+
+    def __init__(self, model, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 max_concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT):
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.upstream_seconds = 0.0
+
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+
+    @classmethod
+    def from_env(cls, model) -> "LLMClient":
+        return cls(
+            model,
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+            ttl=float(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL)),
+            max_concurrency=int(os.getenv("LLM_CONCURRENCY", DEFAULT_CONCURRENCY)),
+            timeout=float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT)),
+        )
+
+    @staticmethod
+    def key(question: str, data_version: Any = "") -> str:
+        return hashlib.sha256(f"{data_version}\x00{normalize(question)}".encode("utf-8")).hexdigest()
+
+    def ask(self, question: str, build_prompt: Callable[[str], str] = None, data_version: Any = "") -> str:
+        """
+        Answer a question. build_prompt(question) is only called on a cache miss, so
+        retrieval and prompt assembly are skipped for cached answers.
+        Raises LLMTimeout if no answer arrives within timeout seconds.
+        """
+        key = self.key(question, data_version)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                future = self._pool.submit(self._call, key, question, build_prompt)
+                self._in_flight[key] = future
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise LLMTimeout(f"No answer within {self.timeout}s") from None
+
+    def generate(self, prompt: str, data_version: Any = "") -> str:
+        """
+        Cached call for an already assembled prompt.
+        """
+        return self.ask(prompt, None, data_version)
+
+    def _call(self, key: str, question: str, build_prompt: Optional[Callable[[str], str]]) -> str:
+        start = time.perf_counter()
+        try:
+            prompt = build_prompt(question) if build_prompt is not None else question
+            with metrics.timer("llm_generate"):
+                text = self.model.generate_content(prompt).text
+        except Exception:
+            with self._lock:
+                self.errors += 1
+                self.upstream_seconds += time.perf_counter() - start
+                self._in_flight.pop(key, None)
+            raise
+
+        # Cached even if every waiter already timed out, so a retry gets it for free.
+        # Publishing and leaving _in_flight happen together, so no caller slips between them.
+        with self._lock:
+            self.upstream_seconds += time.perf_counter() - start
+            self._cache[key] = (time.monotonic() + self.ttl, text)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._in_flight.pop(key, None)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "entries": len(self._cache),
+                "in_flight": len(self._in_flight),
+                "upstream_seconds": self.upstream_seconds,
+            }
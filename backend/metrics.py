@@ -0,0 +1,200 @@
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# Seconds; spans a sub-millisecond feature build up to a slow LLM answer
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = "overtake_"
+
+Labels = Tuple[Tuple[str, str], ...]
+GaugeValue = Union[float, Dict[Labels, float]]
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Histogram:
+    """
+    Bucket counts, sum and count for one label set.
+    """
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Registry:
+    """
+    Latency histograms plus gauges read at scrape time, rendered in the Prometheus
+    text format. Gauges are callbacks, so queue depths and cache counters cost
+    nothing between scrapes. Values are per process, which matches the single
+    gunicorn gthread worker.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Tuple[str, Dict[Labels, Histogram]]] = {}
+        self._gauges: Dict[str, Tuple[str, str, Callable[[], GaugeValue]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, help: str = "", **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._histograms.get(name)
+            if family is None:
+                family = self._histograms[name] = (help, {})
+            histogram = family[1].get(key)
+            if histogram is None:
+                histogram = family[1][key] = Histogram()
+            histogram.observe(seconds)
+
+    def gauge(self, name: str, help: str, read: Callable[[], GaugeValue], kind: str = "gauge") -> None:
+        """
+        Register a value read at scrape time: a number, or {(("label", "value"),): number}.
+        kind is "gauge" or "counter".
+        """
+        with self._lock:
+            self._gauges[name] = (help, kind, read)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            histograms = {name: (help, {labels: (list(h.counts), h.sum, h.count) for labels, h in series.items()})
+                          for name, (help, series) in self._histograms.items()}
+            gauges = dict(self._gauges)
+
+        for name, (help, series) in sorted(histograms.items()):
+            lines.append(f"# HELP {PREFIX}{name} {help}")
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for labels, (counts, total, count) in sorted(series.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), counts):
+                    cumulative += n
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+
+        for name, (help, kind, read) in sorted(gauges.items()):
+            try:
+                value = read()
+            except Exception:
+                continue  # a broken gauge must not take the whole scrape down
+            lines.append(f"# HELP {PREFIX}{name} {help}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for labels, number in (value.items() if isinstance(value, dict) else [((), value)]):
+                lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_value(number)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_HELP = "Seconds spent in each hot-path stage."
+
+
+def observe(stage: str, seconds: float) -> None:
+    REGISTRY.observe("stage_seconds", seconds, STAGE_HELP, stage=stage)
+
+@contextmanager
+def timer(stage: str) -> Iterator[None]:
+    """
+    Time the block into the stage_seconds histogram, including when it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+def timed(stage: str, fn: Callable) -> Callable:
+    """
+    fn wrapped so every call is timed as stage.
+    """
+    def wrapper(*args, **kwargs):
+        with timer(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def gauge(name: str, help: str, read: Callable[[], GaugeValue], kind: str = "gauge") -> None:
+    REGISTRY.gauge(name, help, read, kind)
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+class SampledProfiler:
+    """
+    Runs a random fraction of calls (PROFILE_SAMPLE_RATE, 0..1) under cProfile and
+    merges the results until they are read. Only one call is profiled at a time;
+    others arriving meanwhile run normally.
+    """
+
+    def __init__(self, rate: float = 0.0):
+        self.rate = rate
+        self.profiled = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._busy = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """
+        A running profile if this call was sampled, else None. Pass it to stop().
+        """
+        if self.rate <= 0 or random.random() >= self.rate or not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile: Optional[cProfile.Profile]) -> None:
+        if profile is None:
+            return
+        try:
+            profile.disable()
+            with self._stats_lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+                self.profiled += 1
+        finally:
+            self._busy.release()
+
+    def report(self, limit: int = 40, sort: str = "cumulative", reset: bool = False) -> str:
+        out = io.StringIO()
+        with self._stats_lock:
+            if self._stats is None:
+                return f"No profiles collected (sample rate {self.rate}).\n"
+            out.write(f"{self.profiled} sampled calls, sample rate {self.rate}\n")
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            if reset:
+                self._stats, self.profiled = None, 0
+        return out.getvalue()
+
+
+# Orderings report() accepts, e.g. cumulative, tottime, calls
+PROFILE_SORT_KEYS = tuple(sorted(pstats.Stats.sort_arg_dict_default))
+profiler = SampledProfiler(float(os.getenv("PROFILE_SAMPLE_RATE", "0")))
@@ -0,0 +1,77 @@
+from pathlib import Path
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+ARTIFACT_DIR = Path(os.getenv("MODEL_ARTIFACT_DIR", Path(__file__).resolve().parent / "artifacts"))
+LATEST_NAME = "LATEST"
+MODEL_NAME = "model.keras"
+WEIGHTS_NAME = "model.npz"
+METRICS_NAME = "metrics.json"
+
+
+def new_version(root: Path = ARTIFACT_DIR) -> str:
+    """
+    Sortable, unique name for a new artifact directory: UTC timestamp plus a counter on collision.
+    """
+    base = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+    version, n = base, 1
+    while (Path(root) / version).exists():
+        version = f"{base}.{n}"
+        n += 1
+    return version
+
+def artifact_dir(version: str, root: Path = ARTIFACT_DIR) -> Path:
+    return Path(root) / version
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+def write_metrics(version: str, metrics: Dict[str, Any], root: Path = ARTIFACT_DIR) -> Path:
+    path = artifact_dir(version, root) / METRICS_NAME
+    _write_atomic(path, json.dumps(metrics, indent=2))
+    return path
+
+def read_metrics(version: str, root: Path = ARTIFACT_DIR) -> Dict[str, Any]:
+    try:
+        return json.loads((artifact_dir(version, root) / METRICS_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def publish(version: str, root: Path = ARTIFACT_DIR) -> None:
+    """
+    Point LATEST at version. The pointer is swapped atomically, so readers see the old or new version, never neither.
+    """
+    if not (artifact_dir(version, root) / MODEL_NAME).exists() and not (artifact_dir(version, root) / WEIGHTS_NAME).exists():
+        raise FileNotFoundError(f"artifact {version} has no model under {root}")
+    _write_atomic(Path(root) / LATEST_NAME, version + "\n")
+
+def latest(root: Path = ARTIFACT_DIR) -> Optional[str]:
+    try:
+        version = (Path(root) / LATEST_NAME).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return version if version and artifact_dir(version, root).is_dir() else None
+
+def versions(root: Path = ARTIFACT_DIR) -> List[str]:
+    root = Path(root)
+    if not root.is_dir():
+        return []
+    return sorted(path.name for path in root.iterdir() if path.is_dir() and (path / METRICS_NAME).exists())
+
+def resolve_model_path(default: str) -> str:
+    """
+    Model the server should load: $MODEL_PATH if set, else the published artifact, else default.
+    """
+    if os.getenv("MODEL_PATH"):
+        return os.environ["MODEL_PATH"]
+    version = latest()
+    if version is not None:
+        directory = artifact_dir(version)
+        for name in (MODEL_NAME, WEIGHTS_NAME):
+            if (directory / name).exists():
+                return str(directory / name)
+    return default
@@ -0,0 +1,145 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from model import preprocess, track_cache
+
+DATASET_DIR = Path(os.getenv("DATASET_DIR", Path(__file__).resolve().parent.parent / "data" / "dataset"))
+MANIFEST_NAME = "manifest.json"
+
+
+def code_version() -> str:
+    """
+    Hash of the labelling and feature code, so changing either rebuilds every shard.
+    """
+    digest = hashlib.sha256(track_cache.code_version().encode())
+    digest.update(Path(preprocess.__file__).read_bytes())
+    return digest.hexdigest()
+
+def expand_inputs(paths: Iterable[str]) -> List[Path]:
+    """
+    Car data files from a mix of files and directories (searched recursively for *.json).
+    """
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.rglob("*.json")) if path.is_dir() else [path])
+    return sorted(set(files))
+
+def shard_key(source: Path, version: str) -> str:
+    digest = hashlib.sha256(track_cache._file_digest(source).encode())
+    digest.update(version.encode())
+    return digest.hexdigest()[:24]
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name(f"{path.stem}.tmp{os.getpid()}.npy")
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+def _build_shard(source: str, output: str, key: str) -> Dict[str, object]:
+    # Runs in a worker process: label one file, extract its features and write the shard
+    start = time.perf_counter()
+    data, _ = track_cache.load_track_info(source)
+    features = preprocess.preprocess_frames(data).astype(np.float32)
+    labels = np.asarray(data["percent_per_second"], dtype=np.float32)
+    _save_array(Path(output) / f"{key}.features.npy", features)
+    _save_array(Path(output) / f"{key}.labels.npy", labels)
+    return {
+        "source": source,
+        "key": key,
+        "rows": int(len(labels)),
+        "negative_labels": int(np.count_nonzero(labels < 0)),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def read_manifest(output: Path) -> Dict[str, object]:
+    try:
+        return json.loads((Path(output) / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"shards": []}
+
+def build_dataset(inputs: Iterable[str], output: Path = DATASET_DIR, max_workers: Optional[int] = None) -> Dict[str, object]:
+    """
+    Write one features/labels shard per input file, in parallel worker processes.
+    Shards whose source file and code are unchanged are kept; shards for inputs that
+    are gone are deleted. The manifest is written last and lists the current shards.
+    """
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    version = code_version()
+    sources = expand_inputs(inputs)
+    keys = {str(source): shard_key(source, version) for source in sources}
+
+    previous = {shard["key"]: shard for shard in read_manifest(output)["shards"]}
+    def is_current(key: str) -> bool:
+        return key in previous and all((output / f"{key}.{part}.npy").exists() for part in ("features", "labels"))
+
+    stale = [source for source, key in keys.items() if not is_current(key)]
+    built = {}
+    if stale:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_build_shard, source, str(output), keys[source]) for source in stale]
+            for future in futures:
+                shard = future.result()
+                built[shard["key"]] = shard
+
+    shards = []
+    for source, key in keys.items():
+        shard = built.get(key) or previous[key]
+        shards.append({**shard, "source": source})
+    manifest = {
+        "version": version,
+        "feature_dim": preprocess.NUM_FEATURES,
+        "rows": sum(shard["rows"] for shard in shards),
+        "shards": shards,
+        "built": len(built),
+        "reused": len(shards) - len(built),
+    }
+
+    tmp = output / f"{MANIFEST_NAME}.tmp{os.getpid()}"
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, output / MANIFEST_NAME)
+
+    current = set(keys.values())
+    for path in output.glob("*.npy"):
+        if path.name.split(".")[0] not in current:
+            path.unlink(missing_ok=True)
+    return manifest
+
+def iter_shards(output: Path = DATASET_DIR, mmap: bool = True) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (features, labels) of each shard in manifest order, memory-mapped by default.
+    """
+    output = Path(output)
+    mode = "r" if mmap else None
+    for shard in read_manifest(output)["shards"]:
+        key = shard["key"]
+        yield np.load(output / f"{key}.features.npy", mmap_mode=mode), np.load(output / f"{key}.labels.npy", mmap_mode=mode)
+
+def load_dataset(output: Path = DATASET_DIR) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All shards concatenated into one (features, labels) pair.
+    """
+    shards = list(iter_shards(output, mmap=True))
+    if not shards:
+        return np.zeros((0, preprocess.NUM_FEATURES), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return np.concatenate([features for features, _ in shards]), np.concatenate([labels for _, labels in shards])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build sharded training data from car data files.")
+    parser.add_argument("inputs", nargs="+", help="car data JSON files or directories of them")
+    parser.add_argument("--output", default=str(DATASET_DIR))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = build_dataset(args.inputs, Path(args.output), args.workers)
+    print(f"{manifest['rows']} rows in {len(manifest['shards'])} shards "
+          f"({manifest['built']} built, {manifest['reused']} reused) in {time.perf_counter() - start:.2f}s")
@@ -1,3 +1,5 @@
+import time
+import numpy as np
 import tensorflow as tf
 
 # Suppose your model is something like:
@@ -10,27 +12,102 @@ import tensorflow as tf
 # # Optionally inspect the input shape
 # print("Model input shape:", model.input_shape)
 
-def optimize_input(model, x):
-    # Initialize x as a TensorFlow variable (requires gradient)
-    input_dim = model.input_shape[1]  # e.g., 10
+class SuggestionEngine:
+    """
+    Gradient ascent on the model input, compiled into a single graph.
+    Starts from the car's real features, runs Adam on a whole batch of frames at
+    once and stops each frame early once its predicted output stops improving.
+    """
+
+    def __init__(self, model, learning_rate: float = 0.01, max_steps: int = 100, tolerance: float = 0.0,
+                 trainable_features=None):
+        self.model = model
+        self.input_dim = model.input_shape[1]  # e.g., 15
+        self.learning_rate = learning_rate
+        self.max_steps = max_steps
+        self.tolerance = tolerance
+
+        # Only these feature columns are moved by the ascent; the rest stay at the car's values
+        mask = np.ones((self.input_dim,), dtype=np.float32)
+        if trainable_features is not None:
+            mask[:] = 0.0
+            mask[list(trainable_features)] = 1.0
+        self.mask = tf.constant(mask)
+
+        self.last_stats = {}
+        self._ascend = tf.function(
+            self._ascend_graph,
+            input_signature=[tf.TensorSpec(shape=(None, self.input_dim), dtype=tf.float32)],
+        )
+
+    def _ascend_graph(self, x0):
+        beta_1, beta_2, epsilon = 0.9, 0.999, 1e-7
+        batch = tf.shape(x0)[0]
 
-    # Initialize with random or chosen values
-    x = tf.Variable(tf.random.normal(shape=(1, input_dim)), trainable=True)
+        def objective(x):
+            return tf.reshape(self.model(x, training=False), (batch,))
 
+        def cond(step, x, m, v, prev_y, best_x, best_y, active, iterations):
+            return tf.logical_and(step < self.max_steps, tf.reduce_any(active))
 
-    # x = tf.Variable(initial_value=tf.random.normal(shape=(1, input_dim)))
+        def body(step, x, m, v, prev_y, best_x, best_y, active, iterations):
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                y = objective(x)
+                # Rows are independent, so the gradient of the sum is each row's own gradient
+                total = tf.reduce_sum(y)
+            grads = tape.gradient(total, x) * self.mask
 
-    optimizer = tf.keras.optimizers.Adam(learning_rate=0.01)
+            # Keep the best point seen so far and retire rows whose output stopped improving
+            improved = y > best_y
+            best_x = tf.where(improved[:, None], x, best_x)
+            best_y = tf.where(improved, y, best_y)
+            active = tf.logical_and(active, tf.logical_or(tf.equal(step, 0), y - prev_y > self.tolerance))
 
-    for step in range(100):
-        with tf.GradientTape() as tape:
-            y = model(x)
-            # We want to maximize y, so minimize the negative
-            loss = -y
-        grads = tape.gradient(loss, [x])
-        optimizer.apply_gradients(zip(grads, [x]))
+            t = tf.cast(step + 1, tf.float32)
+            m = beta_1 * m + (1 - beta_1) * grads
+            v = beta_2 * v + (1 - beta_2) * tf.square(grads)
+            m_hat = m / (1 - tf.pow(beta_1, t))
+            v_hat = v / (1 - tf.pow(beta_2, t))
+            active_f = tf.cast(active, tf.float32)
+            x = x + self.learning_rate * m_hat / (tf.sqrt(v_hat) + epsilon) * active_f[:, None]
+            return step + 1, x, m, v, y, best_x, best_y, active, iterations + tf.cast(active, tf.int32)
 
+        zeros = tf.zeros_like(x0)
+        y0 = objective(x0)
+        loop_vars = (tf.constant(0), x0, zeros, zeros, y0, x0, y0, tf.ones((batch,), dtype=tf.bool), tf.zeros((batch,), dtype=tf.int32))
+        _, _, _, _, _, best_x, best_y, _, iterations = tf.while_loop(cond, body, loop_vars)
+        return best_x, best_y, iterations
+
+    def optimize(self, features: np.ndarray):
+        """
+        Optimize a batch of feature rows of shape (N, input_dim).
+        Returns (optimized inputs, predicted outputs) as NumPy arrays.
+        """
+        x0 = np.asarray(features, dtype=np.float32).reshape(-1, self.input_dim)
+        start = time.perf_counter()
+        x, y, iterations = self._ascend(tf.constant(x0))
+        x, y, iterations = x.numpy(), y.numpy(), iterations.numpy()
+        self.last_stats = {
+            "batch_size": len(x0),
+            "iterations": iterations.tolist(),
+            "max_iterations": int(iterations.max()) if len(iterations) else 0,
+            "wall_time": time.perf_counter() - start,
+        }
+        return x, y
+
+
+_engines = {}
+
+def optimize_input(model, x):
+    """
+    Single-frame helper kept for existing callers; warm-starts from x.
+    """
+    engine = _engines.get(id(model))
+    if engine is None or engine.model is not model:
+        engine = _engines[id(model)] = SuggestionEngine(model)
+    optimized, outputs = engine.optimize(np.asarray(x).reshape(1, -1))
     # x now should approximately maximize the model output
     # print("Optimized input:", x.numpy())
     # print("Predicted output:", model(x).numpy())
-    return x.numpy(), model(x).numpy()
+    return optimized, outputs.reshape(-1, 1)
@@ -0,0 +1,262 @@
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from model import track_cache
+from model.telemetry_store import load_telemetry, to_micros
+
+SECTORS = 3  # equal thirds of the lap by track_percent
+DRS_OPEN = 10  # same threshold as preprocess_frame
+SUMMARY_FIELDS = ("driver", "lap", "sector", "samples", "speed_min", "speed_mean", "speed_max", "brake_zones", "drs_pct", "lap_time")
+
+
+class _Totals:
+    __slots__ = ("samples", "speed_sum", "speed_min", "speed_max", "brake_zones", "drs_samples", "start", "end")
+
+    def __init__(self):
+        self.samples = 0
+        self.speed_sum = 0.0
+        self.speed_min = float("inf")
+        self.speed_max = float("-inf")
+        self.brake_zones = 0
+        self.drs_samples = 0
+        self.start = None
+        self.end = None
+
+    def merge(self, other: "_Totals") -> None:
+        self.samples += other.samples
+        self.speed_sum += other.speed_sum
+        self.speed_min = min(self.speed_min, other.speed_min)
+        self.speed_max = max(self.speed_max, other.speed_max)
+        self.brake_zones += other.brake_zones
+        self.drs_samples += other.drs_samples
+        self.start = other.start if self.start is None else min(self.start, other.start)
+        self.end = other.end if self.end is None else max(self.end, other.end)
+
+
+class LapSummary:
+    """
+    Running per-lap and per-sector aggregates of telemetry: speed min/mean/max,
+    braking zones, DRS usage and lap time. Blocks of frames are folded in with
+    array group-bys, so the tables stay current as frames arrive and prompts
+    can quote a few compact rows instead of raw telemetry.
+    """
+
+    def __init__(self):
+        self._totals: Dict[Tuple[int, int, int], _Totals] = {}
+        self._braking: Dict[int, bool] = {}  # last brake state per driver, to spot new braking zones
+        self._latest: Dict[Tuple[int, int], int] = {}  # newest date folded in per (session_key, driver)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, store) -> "LapSummary":
+        summary = cls()
+        summary.update(store)
+        return summary
+
+    @property
+    def version(self) -> int:
+        """
+        Changes whenever a driver enters a new lap or sector; cached answers are keyed on it.
+        """
+        with self._lock:
+            return len(self._totals)
+
+    def update(self, block) -> None:
+        """
+        Fold a columnar block (TelemetryStore or dict of arrays) into the tables.
+        Rows must be in time order per driver. Dated rows no newer than the last one
+        folded in for their session and driver are skipped, so a recording replayed
+        to several clients is counted once.
+        """
+        if "speed" not in block or len(block["speed"]) == 0:
+            return
+        speed = np.asarray(block["speed"], dtype=np.float64)
+        n = len(speed)
+        driver = np.asarray(block["driver_number"], dtype=np.int64) if "driver_number" in block else np.zeros(n, dtype=np.int64)
+        lap = np.asarray(block["lap"], dtype=np.int64) if "lap" in block else np.ones(n, dtype=np.int64)
+        if "track_percent" in block:
+            percent = np.asarray(block["track_percent"], dtype=np.float64)
+            sector = np.minimum((percent * SECTORS).astype(np.int64), SECTORS - 1) + 1
+        else:
+            sector = np.zeros(n, dtype=np.int64)  # unlabelled data is summarized per lap only
+        dates = np.asarray(block["date"], dtype=np.int64) if "date" in block else np.zeros(n, dtype=np.int64)
+        braking = np.asarray(block["brake"]) > 0 if "brake" in block else np.zeros(n, dtype=bool)
+        drs_open = np.asarray(block["drs"]) >= DRS_OPEN if "drs" in block else np.zeros(n, dtype=bool)
+        session = np.asarray(block["session_key"], dtype=np.int64) if "session_key" in block else np.zeros(n, dtype=np.int64)
+
+        with self._lock:
+            if "date" in block:
+                fresh = np.ones(n, dtype=bool)
+                for s, d in np.unique(np.stack([session, driver], axis=1), axis=0).tolist():
+                    rows = np.flatnonzero((session == s) & (driver == d))
+                    latest = self._latest.get((s, d))
+                    if latest is not None:
+                        fresh[rows] = dates[rows] > latest
+                        self._latest[(s, d)] = max(latest, int(dates[rows].max()))
+                    else:
+                        self._latest[(s, d)] = int(dates[rows].max())
+                if not fresh.all():
+                    speed, driver, lap, sector, dates, braking, drs_open = (
+                        column[fresh] for column in (speed, driver, lap, sector, dates, braking, drs_open))
+                    n = len(speed)
+                    if n == 0:
+                        return
+
+            zone_starts = np.zeros(n, dtype=bool)
+            for d in np.unique(driver):
+                rows = np.flatnonzero(driver == d)
+                on = braking[rows]
+                before = np.concatenate([[self._braking.get(int(d), False)], on[:-1]])
+                zone_starts[rows] = on & ~before
+                self._braking[int(d)] = bool(on[-1])
+
+            keys, group = np.unique(np.stack([driver, lap, sector], axis=1), axis=0, return_inverse=True)
+            group = group.ravel()
+            counts = np.bincount(group)
+            speed_sum = np.bincount(group, weights=speed)
+            zones = np.bincount(group, weights=zone_starts)
+            drs = np.bincount(group, weights=drs_open)
+            speed_min = np.full(len(keys), np.inf)
+            speed_max = np.full(len(keys), -np.inf)
+            start = np.full(len(keys), np.iinfo(np.int64).max)
+            end = np.full(len(keys), np.iinfo(np.int64).min)
+            np.minimum.at(speed_min, group, speed)
+            np.maximum.at(speed_max, group, speed)
+            np.minimum.at(start, group, dates)
+            np.maximum.at(end, group, dates)
+
+            for i, key in enumerate(map(tuple, keys.tolist())):
+                part = _Totals()
+                part.samples = int(counts[i])
+                part.speed_sum = float(speed_sum[i])
+                part.speed_min = float(speed_min[i])
+                part.speed_max = float(speed_max[i])
+                part.brake_zones = int(zones[i])
+                part.drs_samples = int(drs[i])
+                part.start = int(start[i])
+                part.end = int(end[i])
+                self._totals.setdefault(key, _Totals()).merge(part)
+
+    def add_frame(self, frame: Dict[str, Any]) -> None:
+        """
+        Fold in one live frame (a car_data dict).
+        """
+        block = {name: [value] for name, value in frame.items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        if "date" in frame:
+            block["date"] = [to_micros(frame["date"])]
+        self.update(block)
+
+    @staticmethod
+    def _row(driver: int, lap: int, sector: Optional[int], totals: _Totals, lap_time: Optional[float]) -> Dict[str, Any]:
+        return {
+            "driver": driver,
+            "lap": lap,
+            "sector": sector,
+            "samples": totals.samples,
+            "speed_min": round(totals.speed_min, 1),
+            "speed_mean": round(totals.speed_sum / totals.samples, 1),
+            "speed_max": round(totals.speed_max, 1),
+            "brake_zones": totals.brake_zones,
+            "drs_pct": round(100.0 * totals.drs_samples / totals.samples, 1),
+            "lap_time": lap_time,
+        }
+
+    def rows(self, drivers: Optional[Iterable[int]] = None, laps: Optional[Iterable[int]] = None,
+             sectors: bool = True) -> List[Dict[str, Any]]:
+        """
+        Lap rows (sector=None) followed by their sector rows, filtered by driver and lap.
+        Lap time is only known once the next lap has started and the lap covered every sector.
+        """
+        drivers = None if drivers is None else set(drivers)
+        laps = None if laps is None else set(laps)
+        with self._lock:
+            per_lap: Dict[Tuple[int, int], _Totals] = {}
+            for (driver, lap, _), totals in self._totals.items():
+                per_lap.setdefault((driver, lap), _Totals()).merge(totals)
+            sector_items = sorted(self._totals.items())
+            covered: Dict[Tuple[int, int], set] = {}
+            for driver, lap, sector in self._totals:
+                covered.setdefault((driver, lap), set()).add(sector)
+
+        result = []
+        for (driver, lap), totals in sorted(per_lap.items()):
+            if (drivers is not None and driver not in drivers) or (laps is not None and lap not in laps):
+                continue
+            following = per_lap.get((driver, lap + 1))
+            # Partial laps (out of the pits, start of the recording) have no lap time
+            complete = following is not None and (covered[(driver, lap)] == {0} or len(covered[(driver, lap)]) == SECTORS)
+            lap_time = round((following.start - totals.start) / 1e6, 3) if complete else None
+            result.append(self._row(driver, lap, None, totals, lap_time))
+            if sectors:
+                for (d, l, sector), sector_totals in sector_items:
+                    if d == driver and l == lap and sector > 0:
+                        result.append(self._row(driver, lap, sector, sector_totals, None))
+        return result
+
+    def laps(self, driver: Optional[int] = None) -> List[int]:
+        with self._lock:
+            return sorted({lap for (d, lap, _) in self._totals if driver is None or d == driver})
+
+    def relevant_rows(self, question: str, drivers: Optional[Iterable[int]] = None, recent_laps: int = 3,
+                      max_rows: int = 40) -> List[Dict[str, Any]]:
+        """
+        The few rows a question is likely about: drivers, laps and sectors it names, otherwise
+        the most recent laps, plus the fastest complete lap for reference.
+        """
+        text = question.lower()
+        if drivers is None:
+            drivers = {int(driver) for driver in re.findall(r"\b(?:driver|car)\s*#?(\d+)", text)} or None
+        laps = {int(lap) for lap in re.findall(r"\blaps?\s*#?(\d+)", text)}
+        sectors = {int(sector) for sector in re.findall(r"\bsector\s*#?(\d)", text)}
+        if not laps:
+            laps = set(self.laps()[-recent_laps:])
+
+        rows = [row for row in self.rows(drivers=drivers, laps=laps)
+                if row["sector"] is None or not sectors or row["sector"] in sectors][:max_rows - 1]
+        complete = [row for row in self.rows(drivers=drivers, sectors=False) if row["lap_time"] is not None]
+        if complete:
+            fastest = min(complete, key=lambda row: row["lap_time"])
+            if fastest not in rows:
+                rows.append(fastest)
+        return rows
+
+
+def format_rows(rows: List[Dict[str, Any]]) -> str:
+    """
+    Compact CSV-style table for prompts; far fewer tokens than indented JSON.
+    """
+    lines = [",".join(SUMMARY_FIELDS)]
+    for row in rows:
+        lines.append(",".join("" if row[name] is None else str(row[name]) for name in SUMMARY_FIELDS))
+    return "\n".join(lines)
+
+def summarize_file(path: str) -> LapSummary:
+    """
+    Summary of a telemetry file. Raw car_data (JSON or CSV) goes through the track cache
+    first, so rows carry lap and track_percent labels. A saved store must already have them.
+    """
+    if str(path).endswith((".json", ".csv")):
+        store, _ = track_cache.load_track_info(str(path))
+    else:
+        store = load_telemetry(str(path))
+    missing = [name for name in ("lap", "track_percent") if name not in store]
+    if missing:
+        raise ValueError(f"{path} has no {' or '.join(missing)} column; label it with track_cache.load_track_info first")
+    return LapSummary.from_store(store)
+
+
+if __name__ == "__main__":
+    # Sanity check: python -m model.lap_summary [file]. Every driver needs several laps and sector rows.
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/car_data.csv"
+    summary = summarize_file(path)
+    rows = summary.rows()
+    for driver in sorted({row["driver"] for row in rows}):
+        laps = summary.laps(driver)
+        sectors = [row for row in rows if row["driver"] == driver and row["sector"] is not None]
+        assert len(laps) > 1, f"driver {driver}: only {len(laps)} lap"
+        assert sectors, f"driver {driver}: no sector rows"
+        print(f"driver {driver}: {len(laps)} laps, {len(sectors)} sector rows")
+    print(format_rows(summary.rows(sectors=False)[:5]))
@@ -0,0 +1,234 @@
+from pathlib import Path
+import io
+import json
+import os
+import time
+import zipfile
+from typing import List, Tuple
+import numpy as np
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    # tanh form never overflows, unlike 1 / (1 + exp(-z)) for very negative z
+    return 0.5 * (1 + np.tanh(0.5 * z))
+
+# Activations supported by the exporter: forward function and derivative w.r.t. the pre-activation
+_ACTIVATIONS = {
+    "linear": (lambda z: z, lambda z, a: np.ones_like(z)),
+    "relu": (lambda z: np.maximum(z, 0), lambda z, a: (z > 0).astype(z.dtype)),
+    "softplus": (lambda z: np.logaddexp(0, z), lambda z, a: _sigmoid(z)),
+    "sigmoid": (_sigmoid, lambda z, a: a * (1 - a)),
+    "tanh": (np.tanh, lambda z, a: 1 - a * a),
+}
+
+
+def read_keras_dense(keras_path: str) -> Tuple[List[np.ndarray], List[np.ndarray], List[str]]:
+    """
+    Kernels, biases and activations of a Sequential stack of Dense layers, read straight
+    from the .keras archive (config.json + model.weights.h5) without importing Keras.
+    """
+    import h5py
+
+    with zipfile.ZipFile(keras_path) as archive:
+        config = json.loads(archive.read("config.json"))
+        weights_file = h5py.File(io.BytesIO(archive.read("model.weights.h5")), "r")
+
+    kernels, biases, activations = [], [], []
+    with weights_file:
+        dense_index = 0
+        for layer in config["config"]["layers"]:
+            if layer["class_name"] == "InputLayer":
+                continue
+            if layer["class_name"] != "Dense":
+                raise ValueError(f"Unsupported layer {layer['class_name']}; only Dense stacks can be exported")
+            if layer["config"]["activation"] not in _ACTIVATIONS:
+                raise ValueError(f"Unsupported activation {layer['config']['activation']}")
+            # Weights are stored under the class name, numbered by position: dense, dense_1, ...
+            group = weights_file["layers"]["dense" if dense_index == 0 else f"dense_{dense_index}"]["vars"]
+            kernels.append(np.asarray(group["0"], dtype=np.float32))
+            biases.append(np.asarray(group["1"], dtype=np.float32) if layer["config"]["use_bias"]
+                          else np.zeros(layer["config"]["units"], dtype=np.float32))
+            activations.append(layer["config"]["activation"])
+            dense_index += 1
+    return kernels, biases, activations
+
+def export_weights(keras_path: str, out_path: str) -> str:
+    """
+    Save a .keras model's Dense weights as a compact .npz for NumpyMLP.
+    """
+    return NumpyMLP(*read_keras_dense(keras_path)).save(out_path)
+
+
+class NumpyMLP:
+    """
+    Forward pass of a dense network in plain NumPy, with the same predict()
+    interface as a Keras model so it can serve without TensorFlow.
+    """
+
+    def __init__(self, kernels: List[np.ndarray], biases: List[np.ndarray], activations: List[str]):
+        self.kernels = [np.ascontiguousarray(kernel, dtype=np.float32) for kernel in kernels]
+        self.biases = [np.asarray(bias, dtype=np.float32) for bias in biases]
+        self.activations = list(activations)
+        self.input_shape = (None, self.kernels[0].shape[0])
+        self.output_shape = (None, self.kernels[-1].shape[1])
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyMLP":
+        """
+        Load exported weights (.npz) or read a .keras archive directly.
+        """
+        if str(path).endswith(".keras"):
+            return cls(*read_keras_dense(path))
+        with np.load(path) as arrays:
+            n_layers = len(arrays["activations"])
+            return cls(
+                [arrays[f"kernel_{i}"] for i in range(n_layers)],
+                [arrays[f"bias_{i}"] for i in range(n_layers)],
+                [str(name) for name in arrays["activations"]],
+            )
+
+    @classmethod
+    def from_keras(cls, keras_path: str, weights_path: str = None) -> "NumpyMLP":
+        """
+        Load the exported weights next to keras_path, (re-)exporting them first if
+        they are missing or older than the .keras file.
+        """
+        weights_path = weights_path or str(Path(keras_path).with_suffix(".npz"))
+        if not os.path.exists(weights_path) or os.path.getmtime(weights_path) < os.path.getmtime(keras_path):
+            export_weights(keras_path, weights_path)
+        return cls.load(weights_path)
+
+    def save(self, path: str) -> str:
+        """
+        Write the weights in the .npz layout load() reads, replacing any existing file atomically.
+        """
+        arrays = {f"kernel_{i}": kernel for i, kernel in enumerate(self.kernels)}
+        arrays.update({f"bias_{i}": bias for i, bias in enumerate(self.biases)})
+        tmp = f"{path}.tmp{os.getpid()}.npz"
+        np.savez(tmp, activations=np.array(self.activations), **arrays)
+        os.replace(tmp, path)
+        return str(path)
+
+    def _forward(self, x: np.ndarray):
+        """
+        Returns the output plus each layer's (pre-activation, activation) for backprop.
+        """
+        trace = []
+        a = x
+        for kernel, bias, name in zip(self.kernels, self.biases, self.activations):
+            z = a @ kernel + bias
+            a = _ACTIVATIONS[name][0](z)
+            trace.append((z, a))
+        return a, trace
+
+    def predict(self, x: np.ndarray, verbose=0, batch_size=None) -> np.ndarray:
+        """
+        Outputs for a batch (N, input_dim) -> (N, outputs), or one row (input_dim,) -> (outputs,).
+        """
+        x = np.asarray(x, dtype=np.float32)
+        out, _ = self._forward(np.atleast_2d(x))
+        return out[0] if x.ndim == 1 else out
+
+    __call__ = predict
+
+    def input_gradient(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Output and d(output)/d(input) for each row, via backprop through the layers.
+        The gradient is of the sum of outputs, i.e. of the single output for this model.
+        """
+        x = np.asarray(x, dtype=np.float32)
+        rows = np.atleast_2d(x)
+        out, trace = self._forward(rows)
+        grad = np.ones_like(out)
+        for kernel, name, (z, a) in zip(reversed(self.kernels), reversed(self.activations), reversed(trace)):
+            grad = (grad * _ACTIVATIONS[name][1](z, a)) @ kernel.T
+        if x.ndim == 1:
+            return out[0], grad[0]
+        return out, grad
+
+    def weight_gradients(self, x: np.ndarray, y: np.ndarray) -> Tuple[float, List[np.ndarray], List[np.ndarray]]:
+        """
+        Mean squared error on (x, y) and its gradient w.r.t. every kernel and bias.
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+        out, trace = self._forward(x)
+        error = out - np.asarray(y, dtype=np.float32).reshape(out.shape)
+        grad = 2 * error / error.size
+        inputs = [x] + [a for _, a in trace[:-1]]
+        kernel_grads, bias_grads = [], []
+        for kernel, name, (z, a), a_in in zip(reversed(self.kernels), reversed(self.activations), reversed(trace), reversed(inputs)):
+            grad = grad * _ACTIVATIONS[name][1](z, a)
+            kernel_grads.append(a_in.T @ grad)
+            bias_grads.append(grad.sum(axis=0))
+            grad = grad @ kernel.T
+        return float(np.mean(np.square(error))), kernel_grads[::-1], bias_grads[::-1]
+
+    def copy(self) -> "NumpyMLP":
+        return NumpyMLP([kernel.copy() for kernel in self.kernels], [bias.copy() for bias in self.biases], self.activations)
+
+
+class NumpySuggestionEngine:
+    """
+    Same masked, early-stopping Adam ascent as gradientAscent.SuggestionEngine,
+    driven by NumpyMLP's analytic gradient instead of a TensorFlow graph.
+    """
+
+    def __init__(self, model: NumpyMLP, learning_rate: float = 0.01, max_steps: int = 100, tolerance: float = 0.0,
+                 trainable_features=None):
+        self.model = model
+        self.input_dim = model.input_shape[1]
+        self.learning_rate = learning_rate
+        self.max_steps = max_steps
+        self.tolerance = tolerance
+
+        self.mask = np.ones((self.input_dim,), dtype=np.float32)
+        if trainable_features is not None:
+            self.mask[:] = 0.0
+            self.mask[list(trainable_features)] = 1.0
+        self.last_stats = {}
+
+    def optimize(self, features: np.ndarray):
+        """
+        Optimize a batch of feature rows of shape (N, input_dim).
+        Returns (optimized inputs, predicted outputs).
+        """
+        beta_1, beta_2, epsilon = 0.9, 0.999, 1e-7
+        start = time.perf_counter()
+        # One model for the whole run, even if a new one is swapped in meanwhile
+        model = self.model
+        x = np.asarray(features, dtype=np.float32).reshape(-1, self.input_dim).copy()
+        batch = len(x)
+        m = np.zeros_like(x)
+        v = np.zeros_like(x)
+        prev_y = model.predict(x).reshape(batch)
+        best_x, best_y = x.copy(), prev_y.copy()
+        active = np.ones(batch, dtype=bool)
+        iterations = np.zeros(batch, dtype=np.int32)
+
+        step = 0
+        while step < self.max_steps and active.any():
+            y, grads = model.input_gradient(x)
+            y = y.reshape(batch)
+            grads *= self.mask
+
+            improved = y > best_y
+            best_x[improved] = x[improved]
+            best_y[improved] = y[improved]
+            active &= (step == 0) | (y - prev_y > self.tolerance)
+
+            t = step + 1
+            m = beta_1 * m + (1 - beta_1) * grads
+            v = beta_2 * v + (1 - beta_2) * np.square(grads)
+            m_hat = m / (1 - beta_1 ** t)
+            v_hat = v / (1 - beta_2 ** t)
+            x = x + self.learning_rate * m_hat / (np.sqrt(v_hat) + epsilon) * active[:, None]
+            iterations += active
+            prev_y = y
+            step += 1
+
+        self.last_stats = {
+            "batch_size": batch,
+            "iterations": iterations.tolist(),
+            "max_iterations": int(iterations.max()) if batch else 0,
+            "wall_time": time.perf_counter() - start,
+        }
+        return best_x, best_y
@@ -3,11 +3,13 @@ import math
 import numpy as np
 from datetime import datetime
 
-from model.track_util import get_track_info # needs to have model. to run, can't have to train
+from model.track_cache import load_track_info # needs to have model. to run, can't have to train
 
 PERCENTAGE_SUBDIVISIONS = 8
 EACH_PERCENTAGE = 1 / PERCENTAGE_SUBDIVISIONS
 NUM_GEARS = 10
+FRAME_FIELDS = ("speed", "throttle", "brake", "rpm", "drs", "n_gear", "track_percent")
+NUM_FEATURES = 6 + PERCENTAGE_SUBDIVISIONS + 1  # speed..n_gear, then the lap subdivision weights
 
 def get_lap_percentage_subdivision(percentage: float):
     arr = np.zeros((PERCENTAGE_SUBDIVISIONS + 1,))
@@ -17,6 +19,10 @@ def get_lap_percentage_subdivision(percentage: float):
     return arr
 
 def preprocess_frame(entry: dict) -> np.ndarray:
+    """
+    Reference implementation for one frame. Serving and training use preprocess_frames
+    (preprocess_row for a single frame), which must match it bit for bit.
+    """
     speed = entry["speed"]
     throttle = entry["throttle"]
     brake = entry["brake"]
@@ -35,25 +41,47 @@ def preprocess_frame(entry: dict) -> np.ndarray:
     features = np.concatenate([np.array([speed, throttle, brake, rpm, drs, n_gear]), lap_percentage_subdivision])
     return features
 
-# Preprocess the data
-def preprocess_data(file_path: str) -> tuple[list, list]:
-    data, corner_points = get_track_info(file_path)
+def get_lap_percentage_subdivisions(percentages: np.ndarray) -> np.ndarray:
+    """
+    Batched get_lap_percentage_subdivision: one row per percentage, same values bit for bit.
+    """
+    percentages = np.asarray(percentages, dtype=np.float64)
+    rows = np.arange(len(percentages))
+    arr = np.zeros((len(percentages), PERCENTAGE_SUBDIVISIONS + 1))
+    index = np.minimum(np.ceil(percentages * PERCENTAGE_SUBDIVISIONS).astype(np.int64), PERCENTAGE_SUBDIVISIONS)
+    lower = index - percentages / EACH_PERCENTAGE
+    # Modulo reproduces Python's negative indexing for index 0
+    arr[rows, (index - 1) % (PERCENTAGE_SUBDIVISIONS + 1)] = lower
+    arr[rows, index % (PERCENTAGE_SUBDIVISIONS + 1)] = 1 - lower
+    return arr
 
-    features_list = []
-    labels = []
+def preprocess_frames(block) -> np.ndarray:
+    """
+    Batched preprocess_frame over a columnar block (TelemetryStore or dict of arrays).
+    Returns the (N, 15) feature matrix, identical to stacking preprocess_frame per row.
+    """
+    columns = [np.asarray(block[name], dtype=np.float64) for name in ("speed", "throttle", "brake", "rpm")]
+    drs = (np.asarray(block["drs"]) >= 10).astype(np.float64)
+    n_gear = np.asarray(block["n_gear"], dtype=np.float64)
+    lap_percentage_subdivision = get_lap_percentage_subdivisions(block["track_percent"])
+    return np.column_stack(columns + [drs, n_gear, lap_percentage_subdivision])
+
+def preprocess_row(entry: dict) -> np.ndarray:
+    """
+    Features of one live frame through the batched path, as a one-row block.
+    """
+    return preprocess_frames({name: [entry[name]] for name in FRAME_FIELDS})[0]
 
-    for i in range(len(data)):
-        entry = data[i]
-        features = preprocess_frame(entry)
-        features_list.append(features)
+# Preprocess the data
+def preprocess_data(file_path: str) -> tuple[list, list]:
+    data, corner_points = load_track_info(file_path)
 
-        # labels.append((data[i + 1]["track_percent"] - entry["track_percent"]) / (datetime.fromisoformat(data[i + 1]["date"]).timestamp() - datetime.fromisoformat(entry["date"]).timestamp()))
-        labels.append(data[i]["percent_per_second"])
-        if labels[-1] < 0:
-            print("Negative label detected:", features_list[-1], labels[-1])
-        # labels.append(data[i + 1]["track_percent"] - entry["track_percent"])
+    features = preprocess_frames(data)
+    labels = np.asarray(data["percent_per_second"], dtype=np.float64)
+    for i in np.flatnonzero(labels < 0):
+        print("Negative label detected:", features[i], labels[i])
 
-    return np.array(features_list), np.array(labels)
+    return features, labels
 
     # data = list[{"date": "2025-05-04T19:07:41.269000+00:00", "session_key": 10033, "driver_number": 55, "speed": 0, "brake": 0, "rpm": 0, "n_gear": 0, "drs": 0, "meeting_key": 1259, "throttle": 0, "x": -0.09701424016157034, "y": 0.02749757393235086, "z": -0.007114960805381543}]
     features_list = []
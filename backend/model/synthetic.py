@@ -0,0 +1,285 @@
+"""
+Deterministic synthetic car_data for load and soak testing.
+
+Cars drive the track outline found by corner detection on one recorded car.
+Each lap follows a speed profile limited by cornering grip, traction and
+braking, and throttle, brake, gear, rpm and DRS are derived from that profile.
+Each car and lap gets seeded variation. Output is written one lap at a time,
+so multi-GB sessions never sit in memory. It uses the
+<output>/<session_key>/<driver_number>.json layout that race.py and
+model.dataset read (or CSV with the car_data.csv columns).
+
+    python -m model.synthetic --cars 20 --laps 57 --sessions 24 --output data/synthetic --seed 0
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import csv
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+from model.telemetry_store import from_micros, to_micros
+from model.track_util import get_corner_points, get_track_geometry, load_car_data, preprocess_car_data
+
+UNITS_PER_METER = 10  # OpenF1 positions are in decimetres
+STEP_METERS = 2.0  # resolution of the speed profile along the lap
+TOP_SPEED = 335 / 3.6  # m/s
+MIN_CORNER_SPEED = 60 / 3.6
+# m/s^2 in corners; lower than a real car's because the corner-point outline smooths curves out.
+# Together these give a ~89 s lap of the Miami outline detected on data/car_data.csv (5.2 km),
+# close to the real race pace.
+LATERAL_GRIP = 15.0
+MAX_ACCELERATION = 8.0  # m/s^2 at low speed, falling to 0 at top speed
+MAX_BRAKING = 45.0
+LINE_WANDER_METERS = 150.0  # distance over which the line drifts about 1 m to either side
+SAMPLE_SECONDS = 0.27  # mean interval between samples, like the recorded feed
+GEAR_SPEEDS = (0, 95, 130, 165, 200, 235, 270, 300)  # km/h at which each gear (1-8) takes over
+CSV_FIELDS = ("date", "session_key", "driver_number", "speed", "brake", "rpm", "n_gear", "drs", "meeting_key",
+              "throttle", "x", "y", "z")
+DEFAULT_DRIVERS = (1, 4, 10, 12, 14, 16, 18, 22, 23, 27, 30, 31, 43, 44, 55, 63, 81, 87, 5, 6)
+DEFAULT_START = "2025-05-04T20:00:00+00:00"
+TRACK_METERS = (3000, 7500)  # outline lengths accepted; every current circuit is 3.3-7.0 km
+DEFAULT_TRACK = Path(__file__).resolve().parent.parent / "data" / "car_data.json"
+if not DEFAULT_TRACK.exists():
+    DEFAULT_TRACK = DEFAULT_TRACK.with_suffix(".csv")
+
+CornerPoints = List[Tuple[float, float]]
+
+
+class SyntheticTrack:
+    """
+    The closed polyline through the corner points, resampled every STEP_METERS,
+    with a reference speed profile for one lap and the DRS zones on it.
+    """
+
+    def __init__(self, corner_points: CornerPoints):
+        geometry = get_track_geometry(corner_points)
+        self.corner_points = [tuple(point) for point in corner_points]
+        self.length = geometry.total_length / UNITS_PER_METER  # metres
+        self.distance = np.arange(0.0, self.length, STEP_METERS)
+        # Positions at each step, interpolated along the polyline that starts and ends at the first corner point
+        vertices = np.vstack([geometry.starts, geometry.starts[:1]])
+        along = np.concatenate([[0.0], np.cumsum(geometry.lengths)]) / UNITS_PER_METER
+        self.x = np.interp(self.distance, along, vertices[:, 0])
+        self.y = np.interp(self.distance, along, vertices[:, 1])
+        # Unit normals, for moving the car across the track without moving it along
+        dx, dy = np.gradient(self.x), np.gradient(self.y)
+        norm = np.hypot(dx, dy)
+        norm[norm == 0] = 1.0
+        self.normal = np.stack([-dy / norm, dx / norm], axis=1)
+
+        # Curvature at each corner point: heading change over the mean length of its two segments
+        headings = np.arctan2(geometry.vectors[:, 1], geometry.vectors[:, 0])
+        turn = np.abs(np.angle(np.exp(1j * (headings - np.roll(headings, 1)))))
+        span = (geometry.lengths + np.roll(geometry.lengths, 1)) / 2 / UNITS_PER_METER
+        corner_speed = np.sqrt(LATERAL_GRIP / np.maximum(turn / span, 1e-6))
+        limit = np.full(len(self.distance), TOP_SPEED)
+        corner_steps = np.minimum((along[:-1] / STEP_METERS).astype(int), len(self.distance) - 1)
+        np.minimum.at(limit, corner_steps, np.clip(corner_speed, MIN_CORNER_SPEED, TOP_SPEED))
+        self.limit = limit
+        self.speed = self.profile(1.0)
+
+        # DRS on the two longest flat-out stretches
+        flat_out = self.speed >= TOP_SPEED * 0.8
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], flat_out.astype(int), [0]])))
+        runs = sorted(zip(edges[::2], edges[1::2]), key=lambda run: run[1] - run[0], reverse=True)[:2]
+        self.drs_zones = [(int(start), int(stop)) for start, stop in runs]
+
+    def profile(self, pace: float) -> np.ndarray:
+        """
+        Fastest speed (m/s) at every step for a car with this much grip and power (1.0 = reference).
+        Forward pass for acceleration, backward pass for braking, twice round so the lap closes.
+        """
+        limit = np.minimum(self.limit * np.sqrt(pace), TOP_SPEED * pace)
+        n = len(limit)
+        top = TOP_SPEED * pace
+        speed = np.concatenate([limit, limit])
+        for i in range(1, 2 * n):
+            accel = MAX_ACCELERATION * pace * max(0.0, 1 - (speed[i - 1] / top) ** 2)
+            speed[i] = min(speed[i], np.sqrt(speed[i - 1] ** 2 + 2 * accel * STEP_METERS))
+        for i in range(2 * n - 2, -1, -1):
+            speed[i] = min(speed[i], np.sqrt(speed[i + 1] ** 2 + 2 * MAX_BRAKING * pace * STEP_METERS))
+        return speed[n:].copy()
+
+
+def _lap_channels(track: SyntheticTrack, speed: np.ndarray, first_lap: bool) -> Dict[str, np.ndarray]:
+    """
+    Throttle, brake, gear, rpm and DRS at every step of a lap driven at speed (m/s).
+    """
+    ahead = np.roll(speed, -1)
+    accel = (ahead ** 2 - speed ** 2) / (2 * STEP_METERS)
+    kmh = speed * 3.6
+    braking = accel < -5.0
+    flat_out = accel > 0.5
+    throttle = np.where(braking, 0, np.where(flat_out, 100, np.clip(40 + kmh / 5, 40, 99)))
+    brake = np.where(braking, 100, 0)
+    gear = np.searchsorted(GEAR_SPEEDS, kmh, side="right")
+    low = np.asarray(GEAR_SPEEDS)[gear - 1]
+    high = np.append(np.asarray(GEAR_SPEEDS[1:]), 360)[gear - 1]
+    rpm = 10000 + 2000 * np.clip((kmh - low) / (high - low), 0, 1)
+    drs = np.zeros(len(speed), dtype=int)
+    if not first_lap:
+        for start, stop in track.drs_zones:
+            drs[max(0, start - 50):start] = 8  # detected within a second of the car ahead: available
+            open_ = np.arange(start, stop)
+            drs[open_[flat_out[open_] | (accel[open_] >= 0)]] = 12
+    return {"throttle": throttle, "brake": brake, "n_gear": gear, "rpm": rpm, "drs": drs}
+
+def drive(track: SyntheticTrack, laps: int, rng: np.random.Generator, start_micros: int,
+          pace: float = 1.0) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    One columnar block per lap for a single car: dates (epoch micros) and every car_data channel.
+    """
+    clock = float(start_micros)
+    for lap in range(laps):
+        # Slightly different pace each lap, slowly fading as the tyres wear
+        lap_pace = pace * (1 + rng.normal(0, 0.004)) * (1 - 0.0006 * lap)
+        speed = track.profile(lap_pace)
+        channels = _lap_channels(track, speed, lap == 0)
+        # Elapsed time at each step, then sample times at jittered intervals
+        elapsed = np.concatenate([[0.0], np.cumsum(STEP_METERS / speed)])
+        lap_time = elapsed[-1]
+        steps = int(lap_time / SAMPLE_SECONDS * 1.5) + 2
+        times = np.cumsum(rng.uniform(0.6, 1.4, steps) * SAMPLE_SECONDS) - rng.uniform(0, SAMPLE_SECONDS)
+        times = times[(times >= 0) & (times < lap_time)]
+        distance = np.interp(times, elapsed[:-1], track.distance)
+        step = np.minimum((distance / STEP_METERS).astype(int), len(track.distance) - 1)
+
+        # Racing line wanders smoothly across the polyline (never along it, which would run the car backwards)
+        knots = np.arange(0.0, track.length + LINE_WANDER_METERS, LINE_WANDER_METERS)
+        lateral = np.interp(distance, knots, rng.normal(0, 1.0, len(knots))) * UNITS_PER_METER
+        offset = track.normal[step] * lateral[:, None]
+        yield {
+            "date": (clock + times * 1e6).astype(np.int64),
+            "speed": np.rint(np.interp(distance, track.distance, speed) * 3.6 + rng.normal(0, 1.0, len(times))),
+            "throttle": np.rint(channels["throttle"][step]),
+            "brake": channels["brake"][step],
+            "n_gear": channels["n_gear"][step],
+            "rpm": np.rint(channels["rpm"][step] + rng.normal(0, 60, len(times))),
+            "drs": channels["drs"][step],
+            "x": np.round(np.interp(distance, track.distance, track.x) + offset[:, 0]),
+            "y": np.round(np.interp(distance, track.distance, track.y) + offset[:, 1]),
+            "z": np.round(250 + 20 * np.sin(2 * np.pi * distance / track.length)),
+        }
+        clock += lap_time * 1e6
+
+def _records(block: Dict[str, np.ndarray], session_key: int, driver: int, meeting_key: int) -> Iterator[Dict[str, Any]]:
+    columns = {name: block[name].tolist() for name in CSV_FIELDS if name in block and name != "date"}
+    for i, micros in enumerate(block["date"].tolist()):
+        record = {"date": from_micros(micros), "session_key": session_key, "driver_number": driver}
+        for name in ("speed", "brake", "rpm", "n_gear", "drs"):
+            record[name] = int(columns[name][i])
+        record["meeting_key"] = meeting_key
+        record["throttle"] = int(columns["throttle"][i])
+        for name in ("x", "y", "z"):
+            record[name] = float(columns[name][i])
+        yield record
+
+def car_seed(seed: int, session_key: int, driver: int) -> np.random.Generator:
+    # Independent of generation order, so any subset of cars can be regenerated on its own
+    return np.random.default_rng([seed, session_key, driver])
+
+def iter_car(corner_points: CornerPoints, session_key: int, driver: int, laps: int, seed: int = 0,
+             start: str = DEFAULT_START, grid_slot: int = 0, meeting_key: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    car_data records for one car, generated a lap at a time. Cars further down the grid
+    start a little later and are a little slower.
+    """
+    track = SyntheticTrack(corner_points)
+    rng = car_seed(seed, session_key, driver)
+    pace = 1 - 0.002 * grid_slot + rng.normal(0, 0.002)
+    start_micros = to_micros(start) + grid_slot * 300_000
+    for block in drive(track, laps, rng, start_micros, pace):
+        yield from _records(block, session_key, driver, meeting_key)
+
+def write_car(path: str, corner_points: CornerPoints, session_key: int, driver: int, laps: int, seed: int,
+              start: str = DEFAULT_START, grid_slot: int = 0, meeting_key: int = 0, fmt: str = "json") -> Dict[str, Any]:
+    """
+    Generate one car and stream it to path. Returns the row count and time taken.
+    """
+    began = time.perf_counter()
+    rows = 0
+    tmp = Path(f"{path}.tmp{os.getpid()}")
+    with tmp.open("w", encoding="utf-8", newline="") as fh:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+        else:
+            fh.write("[")
+        for record in iter_car(corner_points, session_key, driver, laps, seed, start, grid_slot, meeting_key):
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                fh.write(("\n" if rows == 0 else ",\n") + json.dumps(record))
+            rows += 1
+        if writer is None:
+            fh.write("\n]\n")
+    os.replace(tmp, path)
+    return {"path": str(path), "session_key": session_key, "driver_number": driver, "rows": rows,
+            "seconds": time.perf_counter() - began}
+
+def generate(output: Path, corner_points: CornerPoints, cars: int = 20, laps: int = 10, sessions: int = 1,
+             seed: int = 0, first_session: int = 90001, fmt: str = "json",
+             max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Write sessions x cars files under output/<session_key>/<driver>.<fmt>, one worker process per car.
+    Sessions are a week apart; the same seed always produces the same bytes.
+    """
+    if cars > len(DEFAULT_DRIVERS):
+        drivers = list(range(1, cars + 1))
+    else:
+        drivers = list(DEFAULT_DRIVERS[:cars])
+    output = Path(output)
+    jobs = []
+    for s in range(sessions):
+        session_key = first_session + s
+        (output / str(session_key)).mkdir(parents=True, exist_ok=True)
+        start = from_micros(to_micros(DEFAULT_START) + s * 7 * 86_400 * 1_000_000)
+        for slot, driver in enumerate(drivers):
+            path = output / str(session_key) / f"{driver}.{fmt}"
+            jobs.append((str(path), corner_points, session_key, driver, laps, seed, start, slot, session_key, fmt))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(write_car, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+def corner_points_from(track_file: str) -> CornerPoints:
+    """
+    Track outline detected on one recorded car (JSON or CSV): the driver with the most
+    rows. Raises ValueError if the outline is not the length of a real circuit, which
+    is what several cars mixed together or misaligned columns produce.
+    """
+    records = load_car_data(str(track_file))
+    drivers, counts = np.unique([record["driver_number"] for record in records], return_counts=True)
+    driver = drivers[counts.argmax()]
+    cars = preprocess_car_data([record for record in records if record["driver_number"] == driver])
+    corner_points = get_corner_points(cars) if len(cars) > 1 else []
+    length = get_track_geometry(corner_points).total_length / UNITS_PER_METER if len(corner_points) > 1 else 0.0
+    if not TRACK_METERS[0] <= length <= TRACK_METERS[1]:
+        raise ValueError(f"Track outline from driver {driver} in {track_file} is {length / 1000:.1f} km; "
+                         "expected a single lap of one car")
+    return corner_points
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--track", default=str(DEFAULT_TRACK), help="recorded car data (JSON or CSV) whose track outline is driven")
+    parser.add_argument("--cars", type=int, default=20)
+    parser.add_argument("--laps", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--first-session", type=int, default=90001, help="session_key of the first session")
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--output", default="data/synthetic")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    written = generate(Path(args.output), corner_points_from(args.track), args.cars, args.laps, args.sessions,
+                       args.seed, args.first_session, args.format, args.workers)
+    rows = sum(car["rows"] for car in written)
+    size = sum(os.path.getsize(car["path"]) for car in written)
+    print(f"{rows} rows in {len(written)} files ({size / 1e6:.1f} MB) in {time.perf_counter() - began:.2f}s")
@@ -0,0 +1,187 @@
+from pathlib import Path
+import json
+from typing import Any, Dict, Iterator, List, Optional, Union
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+from model.track_util import EPOCH, parse_timestamps
+
+# Typed columns for car_data rows; "date" is held as epoch microseconds
+SCHEMA = {
+    "date": np.int64,
+    "session_key": np.int32,
+    "meeting_key": np.int32,
+    "driver_number": np.int16,
+    "speed": np.int16,
+    "throttle": np.int16,
+    "brake": np.int16,
+    "rpm": np.int16,
+    "n_gear": np.int16,
+    "drs": np.int16,
+    "x": np.float64,
+    "y": np.float64,
+    "z": np.float64,
+}
+MANIFEST_NAME = "manifest.json"
+
+TimeLike = Union[int, str, datetime]
+
+
+def to_micros(value: TimeLike) -> int:
+    """
+    Convert an ISO string, datetime or epoch-microsecond int to epoch microseconds.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+def from_micros(micros: int) -> str:
+    """
+    Format epoch microseconds the way the telemetry API does.
+    """
+    return (EPOCH + timedelta(microseconds=int(micros))).isoformat(timespec="microseconds")
+
+
+class TelemetryStore:
+    """
+    Column-oriented telemetry: one typed NumPy array per field instead of one dict per row.
+    Saved as a directory of .npy files plus a manifest, and opened memory-mapped so that
+    replay, training and retrieval can all read the same copy without loading it.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        lengths = {len(col) for col in columns.values()}
+        assert len(lengths) <= 1, "all columns must have the same length"
+        self.columns = columns
+        self.length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "TelemetryStore":
+        """
+        Build a store from car_data-style dicts. Numeric fields outside SCHEMA
+        (e.g. track_percent, lap) are kept with an inferred dtype; other fields are dropped.
+        """
+        columns = {}
+        if records and "date" in records[0]:
+            columns["date"] = parse_timestamps(records)
+        names = []
+        for record in records[:1]:
+            names = [name for name, value in record.items()
+                     if name != "date" and isinstance(value, (int, float, np.number)) and not isinstance(value, bool)]
+        for name in names:
+            values = [record.get(name, 0) for record in records]
+            dtype = SCHEMA.get(name)
+            if dtype is not None and np.issubdtype(dtype, np.integer):
+                values = np.rint(values)
+            columns[name] = np.asarray(values, dtype=dtype)
+        return cls(columns)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "TelemetryStore":
+        """
+        Build a store from a CSV export of car_data (see data/jsonConverter.py).
+        """
+        import csv
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                records.append({name: value if name == "date" else float(value) for name, value in row.items()})
+        return cls.from_records(records)
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = True) -> "TelemetryStore":
+        """
+        Open a store written by save(). Columns are memory-mapped read-only unless mmap is False.
+        """
+        path = Path(path)
+        manifest = json.loads((path / MANIFEST_NAME).read_text(encoding="utf-8"))
+        columns = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+            for name in manifest["columns"]
+        }
+        store = cls(columns)
+        assert store.length == manifest["length"], f"Corrupt telemetry store: {path}"
+        return store
+
+    def save(self, path: str) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, col in self.columns.items():
+            np.save(path / f"{name}.npy", np.ascontiguousarray(col))
+        manifest = {
+            "length": self.length,
+            "columns": {name: str(col.dtype) for name, col in self.columns.items()},
+        }
+        # Manifest last, so a half-written store is never opened
+        (path / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __getitem__(self, key):
+        """
+        store["speed"] -> column array, store[i] -> row dict, store[a:b] -> zero-copy sub-store.
+        """
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, slice):
+            return TelemetryStore({name: col[key] for name, col in self.columns.items()})
+        return self.row(key)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self.length):
+            yield self.row(i)
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """
+        One row as a plain dict, shaped like the API's car_data records.
+        """
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        row = {}
+        for name, col in self.columns.items():
+            row[name] = from_micros(col[index]) if name == "date" else col[index].item()
+        return row
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def with_columns(self, **columns: np.ndarray) -> "TelemetryStore":
+        """
+        New store sharing the existing columns with extra/replaced ones added.
+        """
+        return TelemetryStore({**self.columns, **columns})
+
+    def index_range(self, start: Optional[TimeLike] = None, end: Optional[TimeLike] = None) -> slice:
+        """
+        Row slice covering start <= date < end. Rows must be in time order.
+        """
+        dates = self.columns["date"]
+        lo = 0 if start is None else int(np.searchsorted(dates, to_micros(start), side="left"))
+        hi = self.length if end is None else int(np.searchsorted(dates, to_micros(end), side="left"))
+        return slice(lo, max(lo, hi))
+
+    def time_range(self, start: Optional[TimeLike] = None, end: Optional[TimeLike] = None) -> "TelemetryStore":
+        return self[self.index_range(start, end)]
+
+
+def load_telemetry(path: str) -> TelemetryStore:
+    """
+    Open a saved store directory, or build one from a car_data JSON/CSV file.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return TelemetryStore.open(path)
+    if path.suffix == ".csv":
+        return TelemetryStore.from_csv(path)
+    from model.track_util import load_car_data
+    return TelemetryStore.from_records(load_car_data(str(path)))
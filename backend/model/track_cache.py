@@ -0,0 +1,77 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+from typing import List, Optional, Tuple
+
+from model import track_util, telemetry_store
+from model.telemetry_store import TelemetryStore, MANIFEST_NAME
+
+# Bump when the cached layout or labelling changes in a way the source hash would not catch
+CACHE_VERSION = 1
+CACHE_DIR = Path(os.getenv("TRACK_CACHE_DIR", Path(__file__).resolve().parent.parent / "data" / "cache"))
+CORNER_POINTS_NAME = "corner_points.json"
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def code_version() -> str:
+    """
+    Hash of the processing code, so edits to the pipeline invalidate old entries.
+    """
+    digest = hashlib.sha256(str(CACHE_VERSION).encode())
+    for module in (track_util, telemetry_store):
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()
+
+def cache_key(file_path: str, params: Optional[dict] = None) -> str:
+    """
+    Key built from the source file contents, processing parameters and code version.
+    """
+    digest = hashlib.sha256()
+    digest.update(_file_digest(Path(file_path)).encode())
+    digest.update(json.dumps(params or {}, sort_keys=True).encode())
+    digest.update(code_version().encode())
+    return digest.hexdigest()[:32]
+
+def load_track_info(file_path: str = None, cache_dir: str = None,
+                    corner_points: Optional[List[Tuple[float, float]]] = None) -> Tuple[TelemetryStore, List[Tuple[float, float]]]:
+    """
+    Cached get_track_info on a car_data JSON or CSV file: returns the labelled telemetry
+    as a memory-mapped store plus the corner points.
+    The first call for a given input runs the full pipeline and writes the result under cache_dir.
+    """
+    if file_path is None:
+        file_path = "data/car_data.json"
+    cache_dir = Path(cache_dir) if cache_dir is not None else CACHE_DIR
+    key = cache_key(file_path, {"corner_points": [list(point) for point in corner_points]} if corner_points else None)
+    entry = cache_dir / key
+
+    if (entry / MANIFEST_NAME).exists():
+        try:
+            corner_points = json.loads((entry / CORNER_POINTS_NAME).read_text(encoding="utf-8"))
+            return TelemetryStore.open(entry), [tuple(point) for point in corner_points]
+        except Exception as e:
+            print(f"Ignoring unreadable track cache {entry}: {e}")
+
+    cars, corner_points = track_util.get_track_info(file_path, corner_points)
+    store = TelemetryStore.from_records(cars)
+
+    # Build in a private directory and rename into place so readers never see a partial entry
+    tmp = cache_dir / f"{key}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    (tmp / CORNER_POINTS_NAME).parent.mkdir(parents=True, exist_ok=True)
+    (tmp / CORNER_POINTS_NAME).write_text(json.dumps(corner_points), encoding="utf-8")
+    store.save(tmp)
+    shutil.rmtree(entry, ignore_errors=True)
+    try:
+        os.replace(tmp, entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # another process won the race
+    return TelemetryStore.open(entry), corner_points
@@ -1,7 +1,13 @@
 from pathlib import Path
 import json
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MAX_STINT_GAP = 5 * 60  # seconds without data that separate pre-race running from the race
+LAUNCH_SECONDS = 5  # seconds after the restart that are left out of the labelled data
 
 def load_car_data(path: str = None) -> List[Dict[str, Any]]:
     """
@@ -10,6 +16,7 @@ def load_car_data(path: str = None) -> List[Dict[str, Any]]:
       - a list of objects -> returned as-is (filtered to dicts)
       - an object whose values are objects -> returned as list(values)
       - a single object -> returned as [object]
+    A .csv export (data/jsonConverter.py) is read with its typed columns instead.
     """
     if path is None:
         path = "data/car_data.json"
@@ -19,6 +26,10 @@ def load_car_data(path: str = None) -> List[Dict[str, Any]]:
     if not path.exists():
         raise FileNotFoundError(f"Car data file not found: {path}")
 
+    if path.suffix == ".csv":
+        from model.telemetry_store import TelemetryStore  # imports this module
+        return TelemetryStore.from_csv(str(path)).to_records()
+
     with path.open("r", encoding="utf-8") as fh:
         data = json.load(fh)
 
@@ -35,14 +46,21 @@ def load_car_data(path: str = None) -> List[Dict[str, Any]]:
 
     raise ValueError("Unsupported JSON format for car data; expected object or list of objects.")
 
-def preprocess_car_data(cars: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def preprocess_car_data(cars: List[Dict[str, Any]], skip: int = None) -> List[Dict[str, Any]]:
     """
     Preprocess car data by removing ones with zero x, y, z coordinates.
+    Running before the last long pause in the data (e.g. laps to the grid before the
+    start) is dropped, along with the launch that follows it, whose slow, twisting
+    samples would confuse corner detection. Pass skip to drop a fixed number of rows instead.
     """
     cars = list(filter(lambda car: all(abs(car[coord]) > 1 for coord in ["x", "y", "z"]), cars))
     cars = list(filter(lambda car: car["speed"] >= 50, cars))
-    cars = cars[1115:]  # Remove initial invalid data, specific value that's near start
-    return cars
+    if skip is None and cars:
+        micros = parse_timestamps(cars)
+        gaps = np.flatnonzero(np.diff(micros) > MAX_STINT_GAP * 1_000_000)
+        restart = micros[gaps[-1] + 1] if len(gaps) else micros[0]
+        skip = int(np.searchsorted(micros, restart + LAUNCH_SECONDS * 1_000_000, side='left'))
+    return cars[skip:]
 
 def distance(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
     """
@@ -80,43 +98,119 @@ def get_corner_points(cars: List[Dict[str, Any]]) -> List[Tuple[float, float]]:
 
     return corner_points
 
+class TrackGeometry:
+    """
+    Closed track polyline built once from corner points. Holds the cumulative
+    segment lengths and a uniform grid over the segments so whole arrays of
+    positions can be projected onto the track in one call.
+    """
+
+    def __init__(self, corner_points: List[Tuple[float, float]], grid_size: int = 64):
+        assert len(corner_points) > 1
+        self.starts = np.asarray(corner_points, dtype=np.float64)
+        self.ends = np.roll(self.starts, -1, axis=0)
+        self.vectors = self.ends - self.starts
+        self.lengths_sq = self.vectors[:, 0] * self.vectors[:, 0] + self.vectors[:, 1] * self.vectors[:, 1]
+        self.lengths = self.lengths_sq ** 0.5
+        assert np.all(self.lengths > 0.0)
+
+        # Same summation order as walking the corners, closing segment first
+        self.total_length = self.lengths[-1]
+        for length in self.lengths[:-1]:
+            self.total_length += length
+        self.cumulative = np.concatenate([[0.0], np.cumsum(self.lengths)[:-1]])
+
+        self._build_grid(grid_size)
+
+    def _build_grid(self, grid_size: int) -> None:
+        """
+        For every grid cell keep only the segments that can be nearest to some point in it:
+        those within (closest segment to the cell centre + cell diagonal).
+        """
+        lo = np.minimum(self.starts, self.ends).min(axis=0)
+        hi = np.maximum(self.starts, self.ends).max(axis=0)
+        self.cell_size = max(hi[0] - lo[0], hi[1] - lo[1]) / grid_size or 1.0
+        self.origin = lo - self.cell_size
+        self.grid_shape = (np.ceil((hi - self.origin) / self.cell_size).astype(int) + 1)
+
+        gx, gy = np.meshgrid(np.arange(self.grid_shape[0]), np.arange(self.grid_shape[1]), indexing="ij")
+        centres = self.origin + (np.stack([gx.ravel(), gy.ravel()], axis=1) + 0.5) * self.cell_size
+        all_segments = np.broadcast_to(np.arange(len(self.starts)), (len(centres), len(self.starts)))
+        dists, _ = self._distances(centres, all_segments)
+
+        reach = dists.min(axis=1, keepdims=True) + self.cell_size * 2 ** 0.5
+        candidates = dists <= reach
+        width = candidates.sum(axis=1).max()
+        # Candidates stay in segment order so ties resolve like a linear scan; pad with the first one
+        order = np.argsort(~candidates, axis=1, kind="stable")[:, :width]
+        pad = np.arange(width)[None, :] >= candidates.sum(axis=1)[:, None]
+        self.cell_segments = np.where(pad, order[:, :1], order)
+
+    def _distances(self, points: np.ndarray, segments: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distance from each point (N, 2) to each of its candidate segments (N, K), plus the clamped projection t.
+        """
+        start = self.starts[segments]
+        seg = self.vectors[segments]
+        px = points[:, None, 0]
+        py = points[:, None, 1]
+        t = ((px - start[..., 0]) * seg[..., 0] + (py - start[..., 1]) * seg[..., 1]) / self.lengths_sq[segments]
+        t = np.clip(t, 0.0, 1.0)
+        cx = start[..., 0] + seg[..., 0] * t
+        cy = start[..., 1] + seg[..., 1] * t
+        return ((px - cx) ** 2 + (py - cy) ** 2) ** 0.5, t
+
+    def project(self, positions: np.ndarray, turn_local: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Project an (N, 2) array of positions onto the track.
+        Returns (distance from track, fraction along the track) arrays of shape (N,).
+        With turn_local the fraction is along the closest segment instead of the whole lap.
+        """
+        points = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        cells = np.floor((points - self.origin) / self.cell_size).astype(int)
+        inside = np.all((cells >= 0) & (cells < self.grid_shape), axis=1)
+
+        dists = np.empty(len(points))
+        segment = np.empty(len(points), dtype=int)
+        t = np.empty(len(points))
+        for mask, candidates in (
+            (inside, self.cell_segments[cells[inside, 0] * self.grid_shape[1] + cells[inside, 1]]),
+            (~inside, np.broadcast_to(np.arange(len(self.starts)), (int((~inside).sum()), len(self.starts)))),
+        ):
+            if not mask.any():
+                continue
+            d, ts = self._distances(points[mask], candidates)
+            best = np.argmin(d, axis=1)
+            rows = np.arange(len(best))
+            dists[mask] = d[rows, best]
+            segment[mask] = candidates[rows, best]
+            t[mask] = ts[rows, best]
+
+        seg = self.vectors[segment]
+        along = ((seg[:, 0] * t) ** 2 + (seg[:, 1] * t) ** 2) ** 0.5
+        if turn_local:
+            return dists, along / self.lengths[segment]
+        return dists, (self.cumulative[segment] + along) / self.total_length
+
+
+@lru_cache(maxsize=8)
+def _cached_geometry(corner_points: Tuple[Tuple[float, float], ...]) -> TrackGeometry:
+    return TrackGeometry(list(corner_points))
+
+def get_track_geometry(corner_points: List[Tuple[float, float]]) -> TrackGeometry:
+    """
+    Shared TrackGeometry for a set of corner points, built on first use.
+    """
+    return _cached_geometry(tuple(tuple(point) for point in corner_points))
+
 def get_dist_from_track_and_dist(pos: Tuple[float, float], corner_points: List[Tuple[float, float]], turn_local: bool = False) -> Tuple[float, float]:
     """
     Calculate the distance from the track based on corner points.
     """
     assert len(corner_points) > 1
 
-    distance_covered = 0.0
-    total_length = distance(corner_points[0], corner_points[-1])
-    for i in range(len(corner_points) - 1):
-        total_length += distance(corner_points[i], corner_points[i + 1])
-    closest_dist = float('inf')
-    closest_percent = 0.0
-    for i in range(len(corner_points)):
-        start = corner_points[i]
-        end = corner_points[(i + 1) % len(corner_points)]
-        segment_length = distance(start, end)
-        assert segment_length > 0.0
-
-        dist_to_segment = min(distance(pos, start), distance(pos, end))
-        seg = (end[0] - start[0], end[1] - start[1])
-        seg_len_sq = seg[0] * seg[0] + seg[1] * seg[1]
-        closest_point = None
-
-        if seg_len_sq == 0:
-            closest_point = start
-        else:
-            t = ((pos[0] - start[0]) * seg[0] + (pos[1] - start[1]) * seg[1]) / seg_len_sq
-            t = max(0.0, min(1.0, t))
-            closest_point = (start[0] + seg[0] * t, start[1] + seg[1] * t)
-
-        dist_to_segment = distance(pos, closest_point)
-        if dist_to_segment < closest_dist:
-            closest_dist = dist_to_segment
-            closest_percent = (distance_covered + distance(start, closest_point)) / total_length if not turn_local else distance(start, closest_point) / segment_length
-
-        distance_covered += segment_length
-    return closest_dist, closest_percent
+    dists, percents = get_track_geometry(corner_points).project(np.array([pos]), turn_local)
+    return float(dists[0]), float(percents[0])
 
 def get_track_percentage(pos: Tuple[float, float], corner_points: List[Tuple[float, float]], turn_local: bool = False) -> float:
     """
@@ -133,54 +227,57 @@ def get_track_percentage(pos: Tuple[float, float], corner_points: List[Tuple[flo
     
     return closest_percent
 
+def parse_timestamps(cars: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Parse every 'date' once into integer microseconds since the Unix epoch.
+    Naive timestamps are treated as UTC.
+    """
+    micros = np.empty(len(cars), dtype=np.int64)
+    for i, car in enumerate(cars):
+        date = datetime.fromisoformat(car['date'])
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        micros[i] = (date - EPOCH) // timedelta(microseconds=1)
+    return micros
+
+def label_laps_and_rates(percents: np.ndarray, micros: np.ndarray, window: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lap counter and percent-per-second label for each row, given track percentages and
+    timestamps in time order. The rate looks ahead to the first row at least `window`
+    seconds later (or the last row) and is clamped at zero across the finish line.
+    """
+    n = len(percents)
+    # A new lap starts whenever the track percentage wraps back towards zero
+    laps = 1 + np.cumsum(np.diff(percents, prepend=0.0) < 0)
+
+    ahead = np.minimum(np.searchsorted(micros, micros + int(window * 1_000_000), side='left'), n - 1)
+    time_diff = (micros[ahead] - micros) / 1e6
+    percent_diff = np.maximum(percents[ahead] - percents, 0)
+    rates = np.zeros(n)
+    np.divide(percent_diff, time_diff, out=rates, where=time_diff > 0)
+    return laps, rates
+
 def assign_percent_per_second(cars: List[Dict[str, Any]], corner_points: List[Tuple[float, float]]) -> None:
     """
     Assign estimated percentage per second along the track for each car data point.
     """
-    for car in cars:
-        percent = get_track_percentage((car['x'], car['y']), corner_points)
+    if not cars:
+        return
+    positions = np.array([(car['x'], car['y']) for car in cars], dtype=np.float64)
+    _, percents = get_track_geometry(corner_points).project(positions)
+    laps, rates = label_laps_and_rates(percents, parse_timestamps(cars))
+
+    for car, percent, lap, rate in zip(cars, percents.tolist(), laps.tolist(), rates.tolist()):
         car['track_percent'] = percent
-    
-    prev_percent = 0.0
-    # prev_lap_percent = 0.0
-    # start_time = datetime.fromisoformat(cars[0]['date'])
-    lap = 1
-    # points_buffer = []
-    # laps = []
-    for i in range(len(cars)):
-        curr_car = cars[i]
-        if curr_car['track_percent'] < prev_percent:
-            lap += 1
-            # lap_time = (datetime.fromisoformat(curr_car['date']) - start_time).total_seconds()
-            # lap_time /= (1 + curr_car['track_percent'] - prev_lap_percent)
-            # for buffered_car in points_buffer:
-            #     buffered_car['lap_time'] = lap_time
-            # laps.append(lap_time)
-            # start_time = datetime.fromisoformat(curr_car['date'])
-            # points_buffer = []
-            # prev_lap_percent = curr_car['track_percent']
-            # print(curr_car["track_percent"])
-        curr_car['lap'] = lap
-        prev_percent = curr_car['track_percent']
-        # points_buffer.append(curr_car)
-
-        j = i + 1
-        while j < len(cars) and (datetime.fromisoformat(cars[j]['date']) - datetime.fromisoformat(curr_car['date'])).total_seconds() < 1:
-            j += 1
-        if (j == len(cars)):
-            j -= 1
-            if j == i:
-                curr_car['percent_per_second'] = 0.0
-                continue
-        percent_diff = cars[j]['track_percent'] - curr_car['track_percent']
-        time_diff = (datetime.fromisoformat(cars[j]['date']) - datetime.fromisoformat(curr_car['date'])).total_seconds()
-        curr_car['percent_per_second'] = max(percent_diff, 0) / time_diff
+        car['lap'] = lap
+        car['percent_per_second'] = rate
 
 
-def get_track_info(file_path: str = "data/car_data.json") -> Tuple[List[Dict[str, Any]], List[Tuple[float, float]]]:
+def get_track_info(file_path: str = "data/car_data.json", corner_points: List[Tuple[float, float]] = None) -> Tuple[List[Dict[str, Any]], List[Tuple[float, float]]]:
     """
     INIT FUNCTION
     Get predefined track corner points and start/finish points. Returns cars and corner points.
+    Pass another car's corner_points to label this car on the same track outline.
     """
     cars = load_car_data(file_path)
     # print(f"Loaded {len(cars)} car records")
@@ -188,7 +285,8 @@ def get_track_info(file_path: str = "data/car_data.json") -> Tuple[List[Dict[str
     cars = preprocess_car_data(cars)
     # print(f"{len(cars)} car records after preprocessing")
 
-    corner_points = get_corner_points(cars)
+    if corner_points is None:
+        corner_points = get_corner_points(cars)
     # print(f"Identified {len(corner_points)} corner points: {corner_points}")
     assign_percent_per_second(cars, corner_points)
     # for car in cars[:30]:
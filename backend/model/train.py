@@ -0,0 +1,289 @@
+"""
+Train the lap-rate model on dataset shards (built with python -m model.dataset).
+
+Shards are read through memory maps in contiguous chunks. Chunks are shuffled
+across all shards, mixed in a shuffle buffer and batched on a background thread,
+so the dataset never has to fit in RAM and the input side keeps up with training.
+Each run is written to model/artifacts/<version>/ with its metrics, and
+published as LATEST for the server to pick up.
+
+    python -m model.train --dataset data/dataset --epochs 20 --batch-size 32
+"""
+from pathlib import Path
+import argparse
+import itertools
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+from model import artifacts
+from model.dataset import DATASET_DIR, iter_shards, read_manifest
+
+Chunk = Tuple[int, int, int]  # shard index, start row, stop row
+
+
+class ShardPipeline:
+    """
+    Shuffled, prefetched (features, labels) batches over memory-mapped shards.
+    Validation chunks are picked once from the seed, so held-out rows never change
+    between epochs or runs, and are kept contiguous so neighbouring samples of
+    the same stretch of track do not leak between the two sides.
+    """
+
+    def __init__(self, output: Path = DATASET_DIR, batch_size: int = 32, validation_split: float = 0.2,
+                 shuffle_buffer: int = 65536, prefetch: int = 64, chunk_rows: int = 1024, seed: int = 42):
+        self.output = Path(output)
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.prefetch = prefetch
+        self.seed = seed
+        self.manifest = read_manifest(self.output)
+        self.shards = list(iter_shards(self.output, mmap=True))
+        if not self.shards:
+            raise FileNotFoundError(f"no dataset shards under {self.output}")
+        self.feature_dim = int(self.shards[0][0].shape[1])
+
+        chunks = [
+            (i, start, min(start + chunk_rows, len(labels)))
+            for i, (_, labels) in enumerate(self.shards) for start in range(0, len(labels), chunk_rows)
+        ]
+        held_out = np.random.default_rng(seed).random(len(chunks)) < validation_split
+        self.train_chunks: List[Chunk] = [chunk for chunk, held in zip(chunks, held_out) if not held]
+        self.validation_chunks: List[Chunk] = [chunk for chunk, held in zip(chunks, held_out) if held]
+        self.train_rows = sum(stop - start for _, start, stop in self.train_chunks)
+        self.validation_rows = sum(stop - start for _, start, stop in self.validation_chunks)
+        self.wait_seconds = 0.0  # time the consumer spent blocked on the producer
+
+    def _blocks(self, chunks: List[Chunk], rng: Optional[np.random.Generator]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Shuffle-buffer sized blocks of rows; permuted when rng is given, in order otherwise.
+        """
+        if rng is not None:
+            chunks = [chunks[i] for i in rng.permutation(len(chunks))]
+        pending, rows = [], 0
+        for shard, start, stop in chunks:
+            features, labels = self.shards[shard]
+            pending.append((np.asarray(features[start:stop]), np.asarray(labels[start:stop])))
+            rows += stop - start
+            if rows >= self.shuffle_buffer:
+                yield self._mix(pending, rng)
+                pending, rows = [], 0
+        if pending:
+            yield self._mix(pending, rng)
+
+    @staticmethod
+    def _mix(pending, rng):
+        x = np.concatenate([features for features, _ in pending])
+        y = np.concatenate([labels for _, labels in pending])
+        if rng is not None:
+            order = rng.permutation(len(y))
+            x, y = x[order], y[order]
+        return x, y
+
+    def _produce(self, chunks: List[Chunk], rng, out: queue.Queue, stop: threading.Event) -> None:
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            carry_x = np.zeros((0, self.feature_dim), dtype=np.float32)
+            carry_y = np.zeros(0, dtype=np.float32)
+            for x, y in self._blocks(chunks, rng):
+                # Rows short of a full batch roll into the next block, so only the last batch can be small
+                x, y = np.concatenate([carry_x, x]), np.concatenate([carry_y, y])
+                full = len(y) - len(y) % self.batch_size
+                for start in range(0, full, self.batch_size):
+                    if not put((x[start:start + self.batch_size], y[start:start + self.batch_size, None])):
+                        return
+                carry_x, carry_y = x[full:], y[full:]
+            if len(carry_y) and not put((carry_x, carry_y[:, None])):
+                return
+            put(None)
+        except BaseException as e:
+            put(e)
+
+    def batches(self, epoch: int = 0, validation: bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        One pass over the training (or validation) rows, batched on a background thread.
+        Training order depends on seed and epoch, so runs are reproducible; validation is unshuffled.
+        """
+        chunks = self.validation_chunks if validation else self.train_chunks
+        rng = None if validation else np.random.default_rng([self.seed, epoch])
+        out = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(chunks, rng, out, stop), name="shard-pipeline", daemon=True)
+        producer.start()
+        try:
+            while True:
+                waited = time.perf_counter()
+                item = out.get()
+                self.wait_seconds += time.perf_counter() - waited
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+
+    def dataset(self, validation: bool = False):
+        """
+        tf.data view of batches(); each iteration (Keras epoch) starts a new shuffle.
+        """
+        import tensorflow as tf
+
+        epochs = itertools.count()
+        signature = (
+            tf.TensorSpec(shape=(None, self.feature_dim), dtype=tf.float32),
+            tf.TensorSpec(shape=(None, 1), dtype=tf.float32),
+        )
+        generator = (lambda: self.batches(validation=True)) if validation else (lambda: self.batches(next(epochs)))
+        dataset = tf.data.Dataset.from_generator(generator, output_signature=signature)
+        # A known length lets Keras size its epochs instead of running until the generator stops
+        steps = -(-(self.validation_rows if validation else self.train_rows) // self.batch_size)
+        return dataset.apply(tf.data.experimental.assert_cardinality(steps)).prefetch(tf.data.AUTOTUNE)
+
+
+def build_model(input_size: int, learning_rate: float = 0.001):
+    from keras.models import Sequential
+    from keras.layers import Dense, Input
+    from keras import optimizers
+
+    model = Sequential([
+        Input(shape=(input_size,)),
+        Dense(64, activation='relu'),  # first hidden layer
+        Dense(64, activation='softplus'),  # second hidden layer
+        Dense(1)  # output layer - NO activation for regression (can output any value)
+    ])
+    model.compile(optimizer=optimizers.Adam(learning_rate=learning_rate), loss='mse', metrics=['mae'])
+    return model
+
+def _epoch_timer(pipeline: ShardPipeline, verbose: int):
+    from keras.callbacks import Callback
+
+    class EpochTimer(Callback):
+        """
+        Wall time, training throughput and input stall time of every epoch.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.epochs: List[Dict[str, float]] = []
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self._start = time.perf_counter()
+            self._validation = 0.0
+            pipeline.wait_seconds = 0.0
+
+        def on_test_begin(self, logs=None):
+            self._test_start = time.perf_counter()
+
+        def on_test_end(self, logs=None):
+            self._validation += time.perf_counter() - self._test_start
+
+        def on_epoch_end(self, epoch, logs=None):
+            seconds = time.perf_counter() - self._start
+            train_seconds = seconds - self._validation
+            record = {
+                "epoch": epoch + 1,
+                "seconds": round(seconds, 3),
+                "train_seconds": round(train_seconds, 3),
+                "validation_seconds": round(self._validation, 3),
+                "samples_per_second": round(pipeline.train_rows / train_seconds, 1) if train_seconds > 0 else None,
+                "input_wait_seconds": round(pipeline.wait_seconds, 3),
+                **{name: float(value) for name, value in (logs or {}).items()},
+            }
+            self.epochs.append(record)
+            if verbose:
+                print(f"epoch {record['epoch']:>3}  {seconds:7.2f}s  {record['samples_per_second']:>10} samples/s  "
+                      f"input wait {record['input_wait_seconds']:6.2f}s  loss {record.get('loss', float('nan')):.5f}  "
+                      f"val_mae {record.get('val_mae', float('nan')):.5f}")
+
+    return EpochTimer()
+
+def train(dataset_dir: Path = DATASET_DIR, epochs: int = 20, batch_size: int = 32, learning_rate: float = 0.001,
+          validation_split: float = 0.2, shuffle_buffer: int = 65536, prefetch: int = 64, seed: int = 42,
+          root: Path = artifacts.ARTIFACT_DIR, publish: bool = True, verbose: int = 1) -> Tuple[str, Dict[str, object]]:
+    """
+    Train a fresh model on the shards under dataset_dir and save it as a new artifact.
+    Returns (version, metrics).
+    """
+    import keras
+    from model.numpy_mlp import export_weights
+
+    keras.utils.set_random_seed(seed)
+    pipeline = ShardPipeline(dataset_dir, batch_size, validation_split, shuffle_buffer, prefetch, seed=seed)
+    model = build_model(pipeline.feature_dim, learning_rate)
+    timer = _epoch_timer(pipeline, verbose)
+
+    start = time.perf_counter()
+    validation = pipeline.dataset(validation=True) if pipeline.validation_rows else None
+    model.fit(pipeline.dataset(), epochs=epochs, validation_data=validation, callbacks=[timer], verbose=0)
+    total = time.perf_counter() - start
+
+    evaluation = {}
+    if validation is not None:
+        loss, mae = model.evaluate(validation, verbose=0)
+        evaluation = {"validation_loss": float(loss), "validation_mae": float(mae)}
+
+    version = artifacts.new_version(root)
+    directory = artifacts.artifact_dir(version, root)
+    directory.mkdir(parents=True)
+    model.save(directory / artifacts.MODEL_NAME)
+    export_weights(str(directory / artifacts.MODEL_NAME), str(directory / artifacts.WEIGHTS_NAME))
+    metrics = {
+        "version": version,
+        "dataset": {
+            "path": str(Path(dataset_dir).resolve()),
+            "version": pipeline.manifest.get("version"),
+            "shards": len(pipeline.shards),
+            "train_rows": pipeline.train_rows,
+            "validation_rows": pipeline.validation_rows,
+        },
+        "params": {
+            "epochs": epochs,
+            "batch_size": batch_size,
+            "learning_rate": learning_rate,
+            "validation_split": validation_split,
+            "shuffle_buffer": shuffle_buffer,
+            "seed": seed,
+        },
+        "seconds": round(total, 3),
+        "samples_per_second": round(pipeline.train_rows * epochs / total, 1) if total > 0 else None,
+        **evaluation,
+        "epochs": timer.epochs,
+    }
+    artifacts.write_metrics(version, metrics, root)
+    if publish:
+        artifacts.publish(version, root)
+    return version, metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=str(DATASET_DIR), help="directory written by python -m model.dataset")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    parser.add_argument("--validation-split", type=float, default=0.2)
+    parser.add_argument("--shuffle-buffer", type=int, default=65536, help="rows mixed together before batching")
+    parser.add_argument("--prefetch", type=int, default=64, help="batches prepared ahead of the trainer")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--artifacts", default=str(artifacts.ARTIFACT_DIR))
+    parser.add_argument("--no-publish", action="store_true", help="save the artifact without making it LATEST")
+    args = parser.parse_args()
+
+    version, metrics = train(
+        Path(args.dataset), args.epochs, args.batch_size, args.learning_rate, args.validation_split,
+        args.shuffle_buffer, args.prefetch, args.seed, Path(args.artifacts), publish=not args.no_publish,
+    )
+    print(f"saved {version}: {metrics['dataset']['train_rows']} rows x {args.epochs} epochs in {metrics['seconds']:.2f}s "
+          f"({metrics['samples_per_second']} samples/s), validation mae {metrics.get('validation_mae', float('nan')):.5f}")
@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+
+from model import artifacts
+from model.numpy_mlp import NumpyMLP
+
+
+class FrameBuffer:
+    """
+    Fixed-size ring of the most recent labelled feature rows, shared between
+    request threads (add) and the trainer (snapshot). Rows may carry a key
+    identifying the frame they came from; a key already in the ring is not
+    added again.
+    """
+
+    def __init__(self, capacity: int, feature_dim: int):
+        self.features = np.zeros((capacity, feature_dim), dtype=np.float32)
+        self.labels = np.zeros(capacity, dtype=np.float32)
+        self.keys: List[Optional[Hashable]] = [None] * capacity
+        self.capacity = capacity
+        self.added = 0  # rows ever added, so the trainer can tell whether anything is new
+        self.duplicates = 0
+        self._present = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self.added, self.capacity)
+
+    def add(self, features: np.ndarray, label: float, key: Optional[Hashable] = None) -> bool:
+        """
+        Buffer one row, evicting the oldest when full. False if key is already buffered.
+        """
+        with self._lock:
+            if key is not None and key in self._present:
+                self.duplicates += 1
+                return False
+            slot = self.added % self.capacity
+            self._present.discard(self.keys[slot])
+            self.features[slot] = features
+            self.labels[slot] = label
+            self.keys[slot] = key
+            if key is not None:
+                self._present.add(key)
+            self.added += 1
+            return True
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, List[Optional[Hashable]]]:
+        """
+        Copy of the buffered rows and their keys, oldest first.
+        """
+        with self._lock:
+            if self.added <= self.capacity:
+                return self.features[:self.added].copy(), self.labels[:self.added].copy(), self.keys[:self.added]
+            order = np.roll(np.arange(self.capacity), -(self.added % self.capacity))
+            return self.features[order], self.labels[order], [self.keys[i] for i in order]
+
+
+class ModelSlot:
+    """
+    The model currently serving. Readers take .model once per batch; a swap
+    replaces the reference in one step, so a batch runs entirely on the old
+    model or entirely on the new one, which is fully built before it is swapped in.
+    """
+
+    def __init__(self, model, version: str = ""):
+        self._state = (model, version)
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self._state[0]
+
+    @property
+    def version(self) -> str:
+        return self._state[1]
+
+    def swap(self, model, version: str, expected=None) -> bool:
+        """
+        Install model; when expected is given, only if it is still the current model.
+        """
+        with self._lock:
+            if expected is not None and self._state[0] is not expected:
+                return False
+            self._state = (model, version)
+            return True
+
+
+def mse(model: NumpyMLP, x: np.ndarray, y: np.ndarray) -> float:
+    return float(np.mean(np.square(model.predict(x).reshape(-1) - y)))
+
+def fine_tune(model: NumpyMLP, x: np.ndarray, y: np.ndarray, epochs: int = 3, batch_size: int = 256,
+              learning_rate: float = 1e-4, rng: Optional[np.random.Generator] = None) -> NumpyMLP:
+    """
+    Adam on the MSE of (x, y), updating model's weights in place. Pass a copy of a serving model.
+    """
+    beta_1, beta_2, epsilon = 0.9, 0.999, 1e-7
+    rng = rng or np.random.default_rng()
+    params: List[np.ndarray] = model.kernels + model.biases
+    m = [np.zeros_like(p) for p in params]
+    v = [np.zeros_like(p) for p in params]
+    t = 0
+    for _ in range(epochs):
+        order = rng.permutation(len(y))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            _, kernel_grads, bias_grads = model.weight_gradients(x[rows], y[rows])
+            t += 1
+            for p, g, m_p, v_p in zip(params, kernel_grads + bias_grads, m, v):
+                m_p *= beta_1
+                m_p += (1 - beta_1) * g
+                v_p *= beta_2
+                v_p += (1 - beta_2) * np.square(g)
+                p -= learning_rate * (m_p / (1 - beta_1 ** t)) / (np.sqrt(v_p / (1 - beta_2 ** t)) + epsilon)
+    return model
+
+
+class OnlineTrainer:
+    """
+    Background thread that fine-tunes a copy of the serving model on recently
+    replayed frames and their track_util labels. Each recorded frame is buffered
+    once, however many replay clients are served it. The newest holdout_fraction
+    of the buffer is held out; the candidate replaces the serving model only if its
+    error there beats the current model's by min_improvement (relative).
+    Training never touches the serving model, and request threads only pay for
+    a copy into the ring buffer.
+    """
+
+    def __init__(self, slot: ModelSlot, capacity: int = 50000, min_rows: int = 2000, interval: float = 60.0,
+                 holdout_fraction: float = 0.2, epochs: int = 3, batch_size: int = 256, learning_rate: float = 1e-4,
+                 min_improvement: float = 0.01, root: Optional[Path] = None,
+                 on_promote: Optional[Callable[[NumpyMLP, str], None]] = None, seed: int = 0):
+        self.slot = slot
+        self.buffer = FrameBuffer(capacity, slot.model.input_shape[1])
+        self.min_rows = min_rows
+        self.interval = interval
+        self.holdout_fraction = holdout_fraction
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.learning_rate = learning_rate
+        self.min_improvement = min_improvement
+        self.root = root  # artifact directory promoted models are published to, if any
+        self.on_promote = on_promote
+        self._rng = np.random.default_rng(seed)
+        self._trained_at = 0  # buffer.added at the last round
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counts = {"rounds": 0, "promoted": 0, "rejected": 0, "skipped": 0, "errors": 0}
+        self.last_round: Dict[str, Any] = {}
+
+    @classmethod
+    def from_env(cls, slot: ModelSlot, on_promote=None) -> "OnlineTrainer":
+        persist = os.getenv("ONLINE_PERSIST", "1") != "0"
+        return cls(
+            slot,
+            capacity=int(os.getenv("ONLINE_BUFFER_ROWS", "50000")),
+            min_rows=int(os.getenv("ONLINE_MIN_ROWS", "2000")),
+            interval=float(os.getenv("ONLINE_INTERVAL", "60")),
+            learning_rate=float(os.getenv("ONLINE_LEARNING_RATE", "1e-4")),
+            min_improvement=float(os.getenv("ONLINE_MIN_IMPROVEMENT", "0.01")),
+            root=artifacts.ARTIFACT_DIR if persist else None,
+            on_promote=on_promote,
+        )
+
+    def observe(self, features: np.ndarray, label, key: Optional[Hashable] = None) -> None:
+        """
+        Record one labelled frame; unlabelled or non-finite ones are ignored, as is a
+        key, e.g. (session_key, driver_number, date), that is already buffered.
+        """
+        if label is None or not np.isfinite(label):
+            return
+        self.buffer.add(features, label, key)
+
+    def start(self) -> "OnlineTrainer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="online-trainer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.counts["errors"] += 1
+                self.last_round = {"error": repr(e), "time": time.time()}
+                print(f"Online training round failed: {e}")
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        One fine-tune/evaluate/promote round. Skipped until min_rows frames are
+        buffered, and when no new frames arrived since the last round.
+        """
+        added = self.buffer.added
+        if len(self.buffer) < self.min_rows or added == self._trained_at:
+            self.counts["skipped"] += 1
+            return {"skipped": True, "rows": len(self.buffer)}
+        self._trained_at = added
+        x, y, keys = self.buffer.snapshot()
+        split = len(y) - max(1, int(len(y) * self.holdout_fraction))
+        held_out = {key for key in keys[split:] if key is not None}
+        assert not held_out.intersection(keys[:split]), "holdout rows overlap the training rows"
+
+        start = time.perf_counter()
+        current = self.slot.model
+        candidate = fine_tune(current.copy(), x[:split], y[:split], self.epochs, self.batch_size, self.learning_rate, self._rng)
+        train_seconds = time.perf_counter() - start
+        current_error = mse(current, x[split:], y[split:])
+        candidate_error = mse(candidate, x[split:], y[split:])
+
+        promoted = bool(np.isfinite(candidate_error)) and candidate_error < current_error * (1 - self.min_improvement)
+        version = self.slot.version
+        if promoted:
+            version = artifacts.new_version(self.root) if self.root is not None else f"online-{self.counts['promoted'] + 1}"
+            if self.root is not None:
+                self._persist(candidate, version, current_error, candidate_error, split, len(y) - split)
+            promoted = self.slot.swap(candidate, version, expected=current)
+        if promoted:
+            if self.on_promote is not None:
+                self.on_promote(candidate, version)
+            if self.root is not None:
+                artifacts.publish(version, self.root)
+        self.counts["rounds"] += 1
+        self.counts["promoted" if promoted else "rejected"] += 1
+        self.last_round = {
+            "time": time.time(),
+            "train_rows": split,
+            "holdout_rows": len(y) - split,
+            "train_seconds": round(train_seconds, 3),
+            "current_mse": current_error,
+            "candidate_mse": candidate_error,
+            "promoted": promoted,
+            "version": version,
+        }
+        return self.last_round
+
+    def _persist(self, candidate: NumpyMLP, version: str, current_error: float, candidate_error: float,
+                 train_rows: int, holdout_rows: int) -> None:
+        # Written before the swap and only published after it, so a restart picks up what was serving
+        directory = artifacts.artifact_dir(version, self.root)
+        directory.mkdir(parents=True)
+        candidate.save(str(directory / artifacts.WEIGHTS_NAME))
+        artifacts.write_metrics(version, {
+            "version": version,
+            "source": "online",
+            "parent": self.slot.version,
+            "train_rows": train_rows,
+            "holdout_rows": holdout_rows,
+            "parent_holdout_mse": current_error,
+            "holdout_mse": candidate_error,
+            "params": {"epochs": self.epochs, "batch_size": self.batch_size, "learning_rate": self.learning_rate},
+        }, self.root)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.slot.version,
+            "buffered_rows": len(self.buffer),
+            "observed_rows": self.buffer.added,
+            "duplicate_rows": self.buffer.duplicates,
+            **self.counts,
+            "last_round": self.last_round,
+        }
@@ -0,0 +1,178 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from model import track_cache
+from model.telemetry_store import TelemetryStore, from_micros, to_micros
+
+RACE_DATA_DIR = Path(os.getenv("RACE_DATA_DIR", Path(__file__).resolve().parent / "data" / "sessions"))
+STALE_SECONDS = 5.0  # a car with no sample this recent (pitted, retired) is left out of a frame
+
+CornerPoints = List[Tuple[float, float]]
+
+
+def discover(root: Path) -> Dict[str, Dict[int, Path]]:
+    """
+    Car data files laid out as <root>/<session_key>/<driver_number>.json.
+    """
+    sessions = {}
+    root = Path(root)
+    if not root.is_dir():
+        return sessions
+    for session_dir in sorted(path for path in root.iterdir() if path.is_dir()):
+        drivers = {int(path.stem): path for path in session_dir.glob("*.json") if path.stem.isdigit()}
+        if drivers:
+            sessions[session_dir.name] = drivers
+    return sessions
+
+def _process_car(file_path: str, corner_points: Optional[CornerPoints] = None, cache_dir: Optional[str] = None) -> CornerPoints:
+    # Runs in a worker process; the labelled store lands in the track cache for the parent to map
+    _, corner_points = track_cache.load_track_info(file_path, cache_dir, corner_points)
+    return corner_points
+
+
+class RaceSession:
+    """
+    Every car in one session, labelled against a shared track outline so their
+    track positions are comparable, with lookups of all cars at one instant.
+    """
+
+    def __init__(self, key: str, cars: Dict[int, TelemetryStore], corner_points: CornerPoints):
+        self.key = key
+        self.cars = cars
+        self.corner_points = corner_points
+        self._times = {}
+        self._progress = {}
+        for driver, store in cars.items():
+            if len(store) == 0:
+                continue
+            micros = np.asarray(store["date"], dtype=np.int64)
+            percent = np.asarray(store["track_percent"], dtype=np.float64)
+            progress = np.asarray(store["lap"], dtype=np.float64) - 1 + percent
+            # A car whose data starts behind the line has not begun lap 1 yet
+            if percent[0] > 0.5:
+                progress -= 1
+            self._times[driver] = micros
+            # Distance covered in laps; never decreasing, so it can be searched
+            self._progress[driver] = np.maximum.accumulate(progress)
+
+    @property
+    def drivers(self) -> List[int]:
+        return sorted(self._times)
+
+    @property
+    def start(self) -> int:
+        return min(int(times[0]) for times in self._times.values()) if self._times else 0
+
+    @property
+    def end(self) -> int:
+        return max(int(times[-1]) for times in self._times.values()) if self._times else 0
+
+    def time_at_progress(self, driver: int, progress: float) -> float:
+        """
+        Epoch microseconds at which driver first covered progress laps, interpolated between samples.
+        """
+        return float(np.interp(progress, self._progress[driver], self._times[driver]))
+
+    def frames_at(self, instant) -> List[Dict[str, Any]]:
+        """
+        The latest sample of every car at instant (datetime, ISO string or epoch micros),
+        in running order, with position, progress and gaps in seconds to the car
+        ahead and to the leader taken from when those cars passed the same point.
+        """
+        at = to_micros(instant)
+        current = []
+        for driver, micros in self._times.items():
+            index = int(np.searchsorted(micros, at, side="right")) - 1
+            if index < 0 or at - micros[index] > STALE_SECONDS * 1_000_000:
+                continue
+            # Progress interpolated to the instant itself, not the last sample, so gaps are not skewed by sample phase
+            current.append((float(np.interp(at, micros, self._progress[driver])), driver, index))
+        current.sort(reverse=True)
+
+        frames = []
+        for position, (progress, driver, index) in enumerate(current, start=1):
+            frame = self.cars[driver][index]
+            frame["driver_number"] = driver
+            frame["position"] = position
+            frame["progress"] = progress
+            if position == 1:
+                frame["gap_to_car_ahead"] = None
+                frame["gap_to_leader"] = 0.0
+            else:
+                ahead = current[position - 2][1]
+                leader = current[0][1]
+                frame["gap_to_car_ahead"] = (at - self.time_at_progress(ahead, progress)) / 1e6
+                frame["gap_to_leader"] = (at - self.time_at_progress(leader, progress)) / 1e6
+            frames.append(frame)
+        return frames
+
+
+class RaceRegistry:
+    """
+    All loaded sessions by key. Track processing for every car runs in a process
+    pool, with results shared through the on-disk track cache.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, RaceSession] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.sessions
+
+    def __getitem__(self, key: str) -> RaceSession:
+        return self.sessions[key]
+
+    def add(self, key: str, cars: Dict[int, TelemetryStore], corner_points: CornerPoints) -> RaceSession:
+        session = RaceSession(key, cars, corner_points)
+        with self._lock:
+            self.sessions[key] = session
+        return session
+
+    def load(self, sessions: Dict[str, Dict[int, Path]], max_workers: Optional[int] = None, cache_dir: Optional[str] = None) -> None:
+        """
+        Label every driver of every session. The lowest-numbered driver of each session
+        sets its track outline (corner detection), then all other drivers are labelled on it.
+        Workers are forked on Linux, so call this before starting other threads or importing
+        libraries that run their own thread pools (FAISS/OpenMP, TensorFlow).
+        """
+        if not sessions:
+            return
+        references = {key: min(drivers) for key, drivers in sessions.items()}
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            outlines = {
+                key: pool.submit(_process_car, str(sessions[key][driver]), None, cache_dir)
+                for key, driver in references.items()
+            }
+            corner_points = {key: future.result() for key, future in outlines.items()}
+            labelled = [
+                pool.submit(_process_car, str(path), corner_points[key], cache_dir)
+                for key, drivers in sessions.items() for driver, path in drivers.items() if driver != references[key]
+            ]
+            for future in labelled:
+                future.result()
+
+        # Everything is cached now, so these only map the stored columns
+        for key, drivers in sessions.items():
+            reference = references[key]
+            cars = {}
+            for driver, path in drivers.items():
+                outline = None if driver == reference else corner_points[key]
+                cars[driver], _ = track_cache.load_track_info(str(path), cache_dir, outline)
+            self.add(key, cars, corner_points[key])
+
+    @classmethod
+    def from_directory(cls, root: Path = RACE_DATA_DIR, max_workers: Optional[int] = None) -> "RaceRegistry":
+        registry = cls()
+        registry.load(discover(root), max_workers=max_workers)
+        return registry
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            key: {"drivers": session.drivers, "start": from_micros(session.start), "end": from_micros(session.end)}
+            for key, session in self.sessions.items()
+        }
@@ -0,0 +1,321 @@
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+from model.telemetry_store import TelemetryStore
+
+DEFAULT_FRAME_INTERVAL = 0.1  # seconds, used when frames have no usable "date"
+DEFAULT_MAX_RELEASED = 100_000  # released tokens remembered, so they cannot be replayed
+
+
+def frame_offsets(frames: List[Dict[str, Any]]) -> List[float]:
+    """
+    Seconds since the first frame for each frame, taken from the telemetry "date" stamps.
+    """
+    if isinstance(frames, TelemetryStore) and "date" in frames:
+        if len(frames) == 0:
+            return []
+        # Columnar dates are epoch microseconds; clamp so time never runs backwards
+        micros = np.maximum.accumulate(np.asarray(frames["date"], dtype=np.int64))
+        return ((micros - micros[0]) / 1e6).tolist()
+    offsets = []
+    start = None
+    for frame in frames:
+        prev = offsets[-1] if offsets else 0.0
+        try:
+            stamp = datetime.fromisoformat(frame["date"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            offsets.append(prev + DEFAULT_FRAME_INTERVAL if offsets else 0.0)
+            continue
+        if start is None:
+            start = stamp - prev
+        offsets.append(max(stamp - start, prev))
+    return offsets
+
+
+class ReplayClock:
+    """
+    Replays frames in real time on a single producer thread, paced by the original
+    telemetry timestamps scaled by `speed`. Every subscriber sees the same frames;
+    the producer and idle subscribers sleep on events rather than spinning.
+    """
+
+    def __init__(self, frames: List[Dict[str, Any]], speed: float = 1.0,
+                 process_frame: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None):
+        assert speed > 0
+        self.frames = frames
+        self.speed = speed
+        self.process_frame = process_frame or (lambda frame: frame)
+        self.offsets = frame_offsets(frames)
+
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._seq = 0  # number of frames published so far
+        self._latest = None
+        self.finished = False
+        self.errors = 0  # frames skipped because process_frame raised
+
+    def start(self) -> "ReplayClock":
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="replay-clock", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _publish(self, frame: Optional[Dict[str, Any]]) -> None:
+        with self._cond:
+            if frame is None:
+                self.finished = True
+            else:
+                self._latest = frame
+                self._seq += 1
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        start = time.monotonic()
+        try:
+            for index, (frame, offset) in enumerate(zip(self.frames, self.offsets)):
+                delay = start + offset / self.speed - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                if self._stop.is_set():
+                    break
+                try:
+                    processed = self.process_frame(frame)
+                except Exception as e:
+                    # One bad frame is skipped rather than ending the replay for everyone
+                    self.errors += 1
+                    print(f"Replay skipped frame {index}: {e!r}")
+                    continue
+                self._publish(processed)
+        finally:
+            # Subscribers wait on this, so it goes out however the loop ends
+            self._publish(None)
+
+    def subscribe(self) -> "Subscription":
+        return Subscription(self)
+
+
+class Subscription:
+    """
+    Cursor over a ReplayClock. A slow subscriber skips straight to the latest frame
+    instead of building up a backlog.
+    """
+
+    def __init__(self, clock: ReplayClock):
+        self.clock = clock
+        self.seq = 0
+
+    def next(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Block until a frame newer than the last one seen is published.
+        Returns None on timeout or once the replay has finished.
+        """
+        clock = self.clock
+        with clock._cond:
+            ready = clock._cond.wait_for(
+                lambda: clock._seq > self.seq or clock.finished or clock._stop.is_set(), timeout=timeout
+            )
+            if not ready or clock._seq <= self.seq:
+                return None
+            self.seq = clock._seq
+            return clock._latest
+
+    @property
+    def done(self) -> bool:
+        clock = self.clock
+        return (clock.finished or clock._stop.is_set()) and self.seq >= clock._seq
+
+    def __iter__(self):
+        while True:
+            frame = self.next()
+            if frame is None:
+                return
+            yield frame
+
+
+class ReplaySession:
+    """
+    One client's position in a replay. The schedule is fixed by the wall-clock
+    start and speed, which the token carries, so any worker process can pick up
+    a session it has never seen; only the cursor lives in memory.
+    """
+
+    __slots__ = ("dataset", "started", "speed", "cursor", "last_seen")
+
+    def __init__(self, dataset: str, started: float, speed: float, cursor: int = -1):
+        self.dataset = dataset
+        self.started = started  # epoch seconds at which frame offset 0 was due
+        self.speed = speed
+        self.cursor = cursor  # last frame index handed out
+        self.last_seen = time.monotonic()
+
+    def token(self, secret: bytes) -> str:
+        """
+        New id for this session: its schedule, a random suffix and a signature over both.
+        """
+        body = f"{self.dataset}~{int(self.started * 1000)}~{self.speed!r}~{secrets.token_hex(4)}"
+        return f"{body}~{_sign(secret, body)}"
+
+    @classmethod
+    def from_token(cls, token: str, secret: bytes) -> "ReplaySession":
+        """
+        The session a token describes. Raises ValueError unless it was signed with secret.
+        """
+        body, _, signature = token.rpartition("~")
+        if not hmac.compare_digest(signature, _sign(secret, body)):
+            raise ValueError("bad replay token signature")
+        dataset, started, speed, _ = body.split("~")
+        return cls(dataset, int(started) / 1000, float(speed))
+
+    def position(self, offsets: np.ndarray, now: float) -> int:
+        """
+        Index of the latest frame due at wall-clock time now (-1 before the first).
+        """
+        return int(np.searchsorted(offsets, (now - self.started) * self.speed, side="right")) - 1
+
+
+def _sign(secret: bytes, body: str) -> str:
+    return hmac.new(secret, body.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+class ReplaySessions:
+    """
+    Registry of per-client replay sessions over named datasets. Sessions are
+    independent: each has its own cursor and speed, and lookups only take one
+    of a set of striped locks, so clients do not wait on each other.
+    Tokens are signed, so only sessions created here (or by a process sharing
+    REPLAY_SECRET) can be picked up, and released tokens are refused.
+    """
+
+    def __init__(self, datasets: Dict[str, Any], ttl: float = 600, stripes: int = 64, secret: Optional[bytes] = None,
+                 max_released: int = DEFAULT_MAX_RELEASED):
+        self.datasets = datasets
+        self.offsets = {name: np.asarray(frame_offsets(frames), dtype=np.float64) for name, frames in datasets.items()}
+        self.ttl = ttl  # seconds a session may sit idle before it is dropped
+        # Workers that should accept each other's tokens must share REPLAY_SECRET
+        self.secret = secret or os.getenv("REPLAY_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+        self.max_released = max_released
+        self._sessions: Dict[str, ReplaySession] = {}
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._released: "OrderedDict[str, None]" = OrderedDict()
+        self._released_lock = threading.Lock()
+        self._reaped_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _lock_for(self, token: str) -> threading.Lock:
+        return self._locks[hash(token) % len(self._locks)]
+
+    def create(self, dataset: str, speed: float = 1.0, start: int = 0) -> Tuple[str, ReplaySession]:
+        """
+        New session replaying dataset from frame index start at the given speed.
+        Returns (token, session).
+        """
+        if dataset not in self.datasets:
+            raise KeyError(dataset)
+        if not speed > 0:
+            raise ValueError("speed must be positive")
+        offsets = self.offsets[dataset]
+        start = min(max(int(start), 0), len(offsets))
+        first_offset = offsets[start] if start < len(offsets) else 0.0
+        session = ReplaySession(dataset, time.time() - first_offset / speed, float(speed), cursor=start - 1)
+        # Store the schedule exactly as the token encodes it, so rebuilt sessions agree
+        session.started = int(session.started * 1000) / 1000
+        token = session.token(self.secret)
+        while token in self._sessions:
+            token = session.token(self.secret)
+        self._sessions[token] = session
+        self._reap_due()
+        return token, session
+
+    def get(self, token: str) -> Optional[ReplaySession]:
+        """
+        The session for a token, rebuilt from the token itself if this process has not
+        seen it. None for unknown, forged or released tokens.
+        """
+        self._reap_due()
+        session = self._sessions.get(token)
+        if session is None:
+            if token in self._released:
+                return None
+            try:
+                session = ReplaySession.from_token(token, self.secret)
+            except ValueError:
+                return None
+            if session.dataset not in self.datasets or not session.speed > 0:
+                return None
+            session.cursor = session.position(self.offsets[session.dataset], time.time()) - 1
+            session = self._sessions.setdefault(token, session)
+            if token in self._released:  # released while this one was being rebuilt
+                self._sessions.pop(token, None)
+                return None
+        session.last_seen = time.monotonic()
+        return session
+
+    def release(self, token: str) -> bool:
+        """
+        End a session for good: its token is refused from now on. False if the token
+        is unknown, forged or already released.
+        """
+        if self._sessions.pop(token, None) is None:
+            if token in self._released:
+                return False
+            try:
+                ReplaySession.from_token(token, self.secret)
+            except ValueError:
+                return False
+        with self._released_lock:
+            self._released[token] = None
+            while len(self._released) > self.max_released:
+                self._released.popitem(last=False)
+        return True
+
+    def _reap_due(self) -> None:
+        # A full sweep is O(sessions), so run it at most every tenth of the ttl
+        if time.monotonic() - self._reaped_at > self.ttl / 10:
+            self.reap()
+
+    def reap(self) -> None:
+        self._reaped_at = time.monotonic()
+        cutoff = self._reaped_at - self.ttl
+        for token, session in list(self._sessions.items()):
+            if session.last_seen < cutoff:
+                self._sessions.pop(token, None)
+
+    def next_frame(self, token: str, max_wait: float = 15.0):
+        """
+        Claim the session's next frame and sleep until it is due. A client that fell
+        behind skips to the frame due now rather than working through a backlog.
+        Returns the frame, or None once the replay is over.
+        Raises KeyError for an unknown session and TimeoutError if the frame is not due within max_wait.
+        """
+        session = self.get(token)
+        if session is None:
+            raise KeyError(token)
+        offsets = self.offsets[session.dataset]
+        with self._lock_for(token):
+            index = max(session.cursor + 1, session.position(offsets, time.time()))
+            if index >= len(offsets):
+                return None
+            delay = session.started + offsets[index] / session.speed - time.time()
+            if delay > max_wait:
+                raise TimeoutError(f"next frame is due in {delay:.1f}s")
+            session.cursor = index
+        if delay > 0:
+            time.sleep(delay)
+        return self.datasets[session.dataset][index]
@@ -0,0 +1,251 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import faiss
+
+from model.telemetry_store import TelemetryStore
+
+DIMENSION = 256
+# Bump when embed_texts changes, so saved indexes are rebuilt
+EMBEDDER_VERSION = "byte-histogram-v1"
+INDEX_DIR = Path(os.getenv("RETRIEVAL_INDEX_DIR", Path(__file__).resolve().parent / "data" / "index"))
+INDEX_NAME = "index.faiss"
+APPENDED_NAME = "appended.jsonl"
+MANIFEST_NAME = "manifest.json"
+FILTER_COLUMNS = ("driver_number", "session_key", "lap")
+
+
+def index_config() -> Dict[str, Any]:
+    """
+    Index type and tuning knobs, from the environment.
+    flat is exact brute force; ivf and hnsw are approximate and sub-linear.
+    """
+    return {
+        "type": os.getenv("RETRIEVAL_INDEX_TYPE", "flat").lower(),
+        "nlist": int(os.getenv("RETRIEVAL_NLIST", "0")),  # 0 picks ~4 * sqrt(rows)
+        "nprobe": int(os.getenv("RETRIEVAL_NPROBE", "8")),
+        "hnsw_m": int(os.getenv("RETRIEVAL_HNSW_M", "32")),
+        "ef_search": int(os.getenv("RETRIEVAL_EF_SEARCH", "64")),
+    }
+
+def make_index(config: Dict[str, Any], vectors: np.ndarray) -> faiss.Index:
+    """
+    Empty (but trained, where needed) index of the configured type.
+    """
+    kind = config["type"]
+    if kind == "flat":
+        return faiss.IndexFlatL2(DIMENSION)
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(DIMENSION, config["hnsw_m"])
+        index.hnsw.efConstruction = max(40, config["ef_search"])
+        return index
+    if kind == "ivf":
+        # Keep ~39+ training points per list, which faiss needs for stable k-means
+        nlist = config["nlist"] or int(4 * np.sqrt(max(len(vectors), 1)))
+        nlist = max(1, min(nlist, len(vectors) // 39))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(DIMENSION), DIMENSION, nlist)
+        if len(vectors):
+            sample = vectors[np.random.default_rng(0).permutation(len(vectors))[:256 * nlist]]
+            index.train(sample)
+        return index
+    raise ValueError(f"Unknown RETRIEVAL_INDEX_TYPE: {kind}")
+
+
+def embed_texts(texts: Sequence[str]) -> np.ndarray:
+    """
+    Normalized 256-bin histogram of each text's UTF-8 bytes, for a whole batch at once.
+    Unlike hash(char), byte values are the same in every process.
+    """
+    encoded = [text.encode("utf-8") for text in texts]
+    lengths = np.fromiter((len(chunk) for chunk in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    rows = np.repeat(np.arange(len(encoded)), lengths)
+    counts = np.bincount(rows * DIMENSION + data, minlength=len(encoded) * DIMENSION)
+    vectors = counts.reshape(len(encoded), DIMENSION).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+def row_text(row: Dict[str, Any]) -> str:
+    return json.dumps(row)
+
+def read_rows(path: Path) -> List[Dict[str, Any]]:
+    """
+    Rows of a JSON-lines side file. A line that does not parse (a write cut short)
+    is skipped rather than failing the whole file.
+    """
+    if not path.exists():
+        return []
+    rows = []
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                if line.strip():
+                    print(f"Skipping unreadable row in {path}")
+    return rows
+
+
+class TelemetryIndex:
+    """
+    FAISS index over telemetry rows, saved to disk with a manifest describing
+    what it was built from. Rows added after the build are appended to the
+    index and to a side file instead of triggering a rebuild. Adds and searches
+    may come from different threads, so they take turns on the FAISS index.
+    """
+
+    def __init__(self, store: TelemetryStore, index: faiss.Index, directory: Optional[Path] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        self.store = store
+        self.index = index
+        self.directory = directory
+        self.config = config or index_config()
+        self.appended = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.store) + len(self.appended)
+
+    def row(self, idx: int) -> Dict[str, Any]:
+        if idx < len(self.store):
+            return self.store[idx]
+        return self.appended[idx - len(self.store)]
+
+    @staticmethod
+    def manifest_for(store: TelemetryStore, source_digest: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "embedder": EMBEDDER_VERSION,
+            "dimension": DIMENSION,
+            "source": source_digest,
+            "rows": len(store),
+            # Search-time knobs (nprobe, ef_search) can change without a rebuild
+            "index": {name: config[name] for name in ("type", "nlist", "hnsw_m")},
+        }
+
+    @classmethod
+    def build(cls, store: TelemetryStore, config: Optional[Dict[str, Any]] = None, batch_size: int = 65536) -> "TelemetryIndex":
+        config = config or index_config()
+        vectors = np.zeros((len(store), DIMENSION), dtype=np.float32)
+        for start in range(0, len(store), batch_size):
+            rows = store[start:start + batch_size]
+            vectors[start:start + len(rows)] = embed_texts([row_text(row) for row in rows])
+        index = make_index(config, vectors)
+        index.add(vectors)
+        return cls(store, index, config=config)
+
+    @classmethod
+    def load_or_build(cls, store: TelemetryStore, source_path: str, directory: Path = INDEX_DIR,
+                      config: Optional[Dict[str, Any]] = None) -> "TelemetryIndex":
+        """
+        Load the saved index if its manifest matches the source data and index
+        configuration, otherwise rebuild and save it. Rows appended since the
+        build are carried over either way.
+        """
+        directory = Path(directory)
+        config = config or index_config()
+        digest = hashlib.sha256(Path(source_path).read_bytes()).hexdigest() if source_path else ""
+        expected = cls.manifest_for(store, digest, config)
+        appended = read_rows(directory / APPENDED_NAME)
+        try:
+            manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))
+            if all(manifest.get(name) == value for name, value in expected.items()):
+                # IVF lists read through a memory map are read-only, so add() would fail
+                flags = 0 if config["type"] == "ivf" else faiss.IO_FLAG_MMAP
+                index = faiss.read_index(str(directory / INDEX_NAME), flags)
+                if index.ntotal == len(store):
+                    loaded = cls(store, index, directory, config)
+                    loaded._add(appended)
+                    return loaded
+        except FileNotFoundError:
+            pass  # never built here
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"Rebuilding retrieval index: {e}")
+
+        built = cls.build(store, config)
+        built.save(directory, expected, appended)
+        built._add(appended)
+        return built
+
+    def save(self, directory: Path, manifest: Dict[str, Any], appended: Sequence[Dict[str, Any]] = ()) -> None:
+        """
+        Write the base index and manifest, and replace the side file with appended.
+        Appended rows live in the side file and are re-embedded on load, so adding
+        rows never rewrites the index file.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / MANIFEST_NAME).unlink(missing_ok=True)
+        faiss.write_index(self.index, str(directory / INDEX_NAME))
+        tmp = directory / f"{APPENDED_NAME}.tmp"
+        tmp.write_text("".join(row_text(row) + "\n" for row in appended), encoding="utf-8")
+        os.replace(tmp, directory / APPENDED_NAME)
+        # Manifest last: an index without one is rebuilt rather than trusted
+        (directory / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        self.directory = directory
+
+    def _add(self, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            vectors = embed_texts([row_text(row) for row in rows])
+            with self._lock:
+                self.index.add(vectors)
+                self.appended.extend(rows)
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Index new telemetry rows without rebuilding, recording them next to the saved index.
+        """
+        self._add(rows)
+        if rows and self.directory is not None:
+            with self._lock, (self.directory / APPENDED_NAME).open("a", encoding="utf-8") as fh:
+                fh.write("".join(row_text(row) + "\n" for row in rows))
+
+    def matching_ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Row ids whose driver/session/lap match every filter (scalar or list of allowed values).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, allowed in filters.items():
+            if name not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter on {name}; expected one of {FILTER_COLUMNS}")
+            allowed = np.atleast_1d(allowed)
+            base = np.isin(self.store[name], allowed) if name in self.store else np.zeros(len(self.store), dtype=bool)
+            extra = np.isin([row.get(name) for row in self.appended], allowed) if self.appended else np.zeros(0, dtype=bool)
+            mask &= np.concatenate([base, extra])
+        return np.flatnonzero(mask).astype(np.int64)
+
+    def search_params(self, selector=None):
+        kind = self.config["type"]
+        if kind == "ivf":
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.config["nprobe"])
+        if kind == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=max(self.config["ef_search"], 1))
+        return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+    def search(self, query_text: str, k: int = 1, **filters):
+        """
+        Returns [(row index, distance)] for the k nearest rows, optionally restricted
+        with driver_number=, session_key= or lap= filters.
+        """
+        return self.search_vectors(embed_texts([query_text]), k, **filters)[0]
+
+    def search_vectors(self, queries: np.ndarray, k: int = 1, **filters):
+        """
+        Batched search over already embedded queries; one result list per query.
+        """
+        with self._lock:
+            selector = None
+            if filters:
+                ids = self.matching_ids(filters)
+                if len(ids) == 0:
+                    return [[] for _ in range(len(queries))]
+                selector = faiss.IDSelectorBatch(ids)
+            params = self.search_params(selector)
+            distances, indices = self.index.search(queries, k, params=params)
+        return [
+            [(int(idx), float(dist)) for idx, dist in zip(row_indices, row_distances) if 0 <= idx < len(self)]
+            for row_indices, row_distances in zip(indices, distances)
+        ]
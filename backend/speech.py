@@ -0,0 +1,96 @@
+import hashlib
+import os
+import time
+from typing import Iterator, Optional
+
+import metrics
+from http_cache import ResponseCache
+
+DEFAULT_VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"
+DEFAULT_MODEL_ID = "eleven_monolingual_v1"
+CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(__file__), "data", "tts_cache"))
+CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+
+class _FakeTextToSpeech:
+    def __init__(self, chunk_size: int, delay: float):
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.calls = 0
+
+    def convert(self, voice_id: str, model_id: str, text: str, **_) -> Iterator[bytes]:
+        """
+        Deterministic pseudo-audio for the text, yielded chunk by chunk like the real API.
+        """
+        self.calls += 1
+        seed = hashlib.sha256(f"{voice_id}\x00{model_id}\x00{text}".encode("utf-8")).digest()
+        # Roughly proportional to speaking time, like real speech
+        blocks = max(1, len(text) // 4)
+        audio = b"ID3" + b"".join(hashlib.sha256(seed + i.to_bytes(4, "big")).digest() for i in range(blocks))
+        for start in range(0, len(audio), self.chunk_size):
+            if self.delay:
+                time.sleep(self.delay)
+            yield audio[start:start + self.chunk_size]
+
+
+class FakeTTSClient:
+    """
+    Offline stand-in for ElevenLabs exposing the same text_to_speech.convert call.
+    """
+
+    def __init__(self, chunk_size: int = 1024, delay: float = 0.0):
+        self.text_to_speech = _FakeTextToSpeech(chunk_size, delay)
+
+
+def make_tts_client():
+    """
+    ElevenLabs, or FakeTTSClient when TTS_BACKEND=fake (tests, load runs, no API key).
+    """
+    if os.getenv("TTS_BACKEND", "elevenlabs").lower() == "fake":
+        return FakeTTSClient(delay=float(os.getenv("TTS_FAKE_DELAY", "0")))
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+
+
+class SpeechService:
+    """
+    Text to speech that streams audio as it is synthesized and keeps finished
+    clips in a size-bounded disk cache, so repeated callouts are served
+    without calling the TTS API again.
+    """
+
+    def __init__(self, client, cache: ResponseCache, voice_id: str = DEFAULT_VOICE_ID, model_id: str = DEFAULT_MODEL_ID):
+        self.client = client
+        self.cache = cache
+        self.voice_id = voice_id
+        self.model_id = model_id
+
+    @classmethod
+    def from_env(cls, client) -> "SpeechService":
+        # Clips never go stale, so they only leave the cache when it is full
+        return cls(client, ResponseCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES, default_ttl=None))
+
+    def key(self, text: str) -> str:
+        return self.cache.key("tts", {"voice": self.voice_id, "model": self.model_id, "text": text})
+
+    def cached(self, text: str) -> Optional[bytes]:
+        with metrics.timer("tts_cache_lookup"):
+            entry = self.cache.get(self.key(text))
+        return entry.body if entry is not None else None
+
+    def stream(self, text: str) -> Iterator[bytes]:
+        """
+        Yield audio chunks as they arrive. The clip is cached once it is complete;
+        a stream abandoned by the client leaves nothing behind.
+        """
+        chunks = []
+        start = time.perf_counter()
+        for chunk in self.client.text_to_speech.convert(voice_id=self.voice_id, model_id=self.model_id, text=text):
+            if chunk:
+                if not chunks:
+                    metrics.observe("tts_first_chunk", time.perf_counter() - start)
+                chunks.append(chunk)
+                yield chunk
+        # Request to last chunk; includes any time the client took to read earlier chunks
+        metrics.observe("tts_stream", time.perf_counter() - start)
+        self.cache.put(self.key(text), b"".join(chunks), ttl=None, voice=self.voice_id, model=self.model_id)
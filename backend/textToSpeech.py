@@ -15,23 +15,24 @@
 
 import os
 import json
-import numpy as np
-import faiss
+import threading
 from pathlib import Path
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
-import google.generativeai as genai
 from dotenv import load_dotenv
+import metrics
+from llm import LLMClient, make_model
+from model.telemetry_store import TelemetryStore, load_telemetry
+from model.lap_summary import LapSummary, format_rows, summarize_file
+from retrieval import TelemetryIndex, embed_texts, row_text
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-2.5-flash-lite')
+model = make_model('gemini-2.5-flash-lite')
+# Cached, coalesced and rate-limited access to the model
+llm = LLMClient.from_env(model)
 
 def generateResponse(message):
-    response = model.generate_content(
-        contents = message,
-    )
-    return response.text
+    return llm.generate(message)
 
 
 # Simple document class to store text and metadata
@@ -41,89 +42,111 @@ class Document:
         self.metadata = metadata or {}
 
 def compute_embedding(text):
-    """Convert text to a simple vector using character frequencies.
+    """Convert text to a simple vector using byte frequencies.
     This is a basic embedding method that doesn't require external models.
-    It creates a 256-dimensional vector based on character frequencies."""
-    # Create a fixed-size vector (256 dims) from character frequencies
-    vec = np.zeros(256, dtype=np.float32)
-    if not text:
-        return vec
-    # Count character frequencies, normalize, and hash into the vector
-    for char in text:
-        idx = hash(char) % 256
-        vec[idx] += 1.0
-    # Normalize the vector
-    norm = np.linalg.norm(vec)
-    if norm > 0:
-        vec /= norm
-    return vec
+    It creates a 256-dimensional vector; see retrieval.embed_texts."""
+    return embed_texts([text])[0]
 
 # 1. Load and process the data
 try:
     data_path = Path(__file__).parent / "data" / "car_data.json"
     if not data_path.exists():
         data_path = Path(__file__).parent / "data" / "car_data.csv"
-    
-    if data_path.suffix == '.json':
-        raw_data = json.loads(data_path.read_text(encoding='utf-8'))
-        if isinstance(raw_data, list):
-            documents = [Document(json.dumps(item)) for item in raw_data]
-        else:
-            documents = [Document(json.dumps(raw_data))]
-    else:  # CSV
-        import csv
-        documents = []
-        with open(data_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                documents.append(Document(json.dumps(row)))
-except:
-    pass
-# 2. Build FAISS index from documents
-dimension = 256  # matches compute_embedding output dimension
-index = faiss.IndexFlatL2(dimension)
-
-# Compute embeddings for all documents
-doc_embeddings = []
-for doc in documents:
-    vec = compute_embedding(doc.text)
-    doc_embeddings.append(vec)
-
-# Add vectors to FAISS index
-index.add(np.array(doc_embeddings))
-
-def find_similar_documents(query_text, k=1):
-    """Find k most similar documents to the query text."""
-    # Convert query to vector (same dimension as document vectors)
-    query_vector = compute_embedding(query_text)
-    # Reshape for faiss search
-    query_vector = query_vector.reshape(1, -1)
-    
-    # Search the index
-    distances, indices = index.search(query_vector, k)
-    
-    # Return the matching documents and their distances
+    # Rows stay columnar; a Document is only materialized for search hits
+    documents = load_telemetry(str(data_path))
+except Exception as e:
+    print(f"Error loading {data_path}: {e}")
+    data_path = None
+    documents = TelemetryStore({})
+
+# 2. Load the saved FAISS index, or build and save it if the data changed
+index = TelemetryIndex.load_or_build(documents, str(data_path) if data_path else None)
+
+# 3. Per-lap and per-sector aggregates; live frames are folded in as they arrive
+try:
+    lap_summary = summarize_file(str(data_path)) if data_path else LapSummary()
+except Exception as e:
+    print(f"Error summarizing {data_path}: {e}")
+    lap_summary = LapSummary()
+
+# 4. Replayed frames join the index in batches, once per recorded frame however many clients it was served to
+INDEX_BATCH = int(os.getenv("RETRIEVAL_ADD_BATCH", "256"))
+_pending_rows = []
+_indexed_frames = set()
+_pending_lock = threading.Lock()
+
+def index_frame(frame):
+    """Queue a served frame's scalar fields for the index, adding them once INDEX_BATCH have gathered."""
+    key = (frame.get("session_key"), frame.get("driver_number"), frame["date"]) if "date" in frame else None
+    with _pending_lock:
+        if key is not None:
+            if key in _indexed_frames:
+                return
+            _indexed_frames.add(key)
+        _pending_rows.append({name: value for name, value in frame.items() if isinstance(value, (int, float, str))})
+        if len(_pending_rows) < INDEX_BATCH:
+            return
+    flush_frames()
+
+def flush_frames():
+    """Index every queued frame now."""
+    global _pending_rows
+    with _pending_lock:
+        rows, _pending_rows = _pending_rows, []
+    index.add(rows)
+
+def get_document(idx):
+    return Document(row_text(index.row(idx)))
+
+def find_similar_documents(query_text, k=1, **filters):
+    """Find k most similar documents to the query text.
+    Filters (driver_number, session_key, lap) restrict the rows searched."""
     results = []
-    for idx, dist in zip(indices[0], distances[0]):
-        if idx < len(documents):  # ensure valid index
-            doc = documents[idx]
-            results.append({
-                'text': doc.text,
-                'distance': float(dist),
-                'metadata': doc.metadata
-            })
+    for idx, dist in index.search(query_text, k, **filters):
+        doc = get_document(idx)
+        results.append({
+            'text': doc.text,
+            'distance': dist,
+            'metadata': doc.metadata
+        })
     return results
 
 
-def communicate (query):
-    matches = find_similar_documents(query)
-    message = f"""An F1 engineer has asked you {query}, and you need to incorporate the relevant facts in {matches} into a cohesive response.
+def relevant_summary(query, matches):
+    """Compact lap/sector rows for the question, plus the laps the retrieved rows belong to."""
+    rows = lap_summary.relevant_rows(query)
+    for match in matches:
+        row = json.loads(match['text'])
+        if 'lap' in row:
+            drivers = [row['driver_number']] if 'driver_number' in row else None
+            rows.extend(r for r in lap_summary.rows(drivers=drivers, laps=[row['lap']], sectors=False) if r not in rows)
+    return format_rows(rows)
+
+def build_message(query):
+    with metrics.timer("retrieval"):
+        matches = find_similar_documents(query)
+    with metrics.timer("lap_summary_rows"):
+        facts = relevant_summary(query, matches) + "\n" + "\n".join(match['text'] for match in matches)
+    message = f"""An F1 engineer has asked you {query}, and you need to incorporate the relevant facts in {facts} into a cohesive response.
     Do not include everything since not everything is relevant to the user's query. Do NOT include the full data itself, that is meant to be hidden from the user.
     They are only supposed to know what they asked for. Keep your responses concise and short. Do not use markdown formatting."""
     # print(f"\nFound {len(matches)} similar items:")
     # for i, match in enumerate(matches, 1):
     #     print(f"\n{i}. Distance: {match['distance']:.3f}")
     #     print(f"   Content: {match['text'][:200]}...")
-    return generateResponse(message=message)
+    return message
+
+def data_version():
+    """Changes when rows are indexed or a new lap/sector shows up, retiring cached answers."""
+    return f"{len(index)}:{lap_summary.version}"
+
+def communicate (query):
+    if isinstance(query, bytes):
+        query = query.decode("utf-8")
+    # Questions see every frame served so far
+    flush_frames()
+    # Retrieval and prompt assembly only run when the answer is not cached
+    return llm.ask(query, build_message, data_version=data_version())
 
-print(communicate("what's the drs of verstappen"))
\ No newline at end of file
+if __name__ == "__main__":
+    print(communicate("what's the drs of verstappen"))
\ No newline at end of file
@@ -75,12 +75,8 @@ export default function App() {
   }
   
   async function playAudio(message: string) {
-    const audioData = await (await fetch(import.meta.env.VITE_BACKEND_ENDPOINT + "/speak", {method: "POST", body: message})).arrayBuffer();
-    // audioData can be a ReadableStream — normalize it to an ArrayBuffer first
-    const arrayBuffer = await new Response(audioData as any).arrayBuffer();
-    const blob = new Blob([arrayBuffer], { type: "audio/mpeg" });
-    const audioUrl = URL.createObjectURL(blob);
-    const audio = new Audio(audioUrl);
+    // Let the browser stream the clip: playback starts with the first chunk, and cached clips support seeking
+    const audio = new Audio(import.meta.env.VITE_BACKEND_ENDPOINT + "/speak?text=" + encodeURIComponent(message));
     await audio.play();
   }
 
@@ -222,40 +218,38 @@ export default function App() {
     }
   }
 
-  const [b, setB] = useState<boolean>(false);
   const [suggestions, setSuggestions] = useState<{ [key: string]: string }>({});
 
   useEffect(() => {
-    fetch(import.meta.env.VITE_BACKEND_ENDPOINT + "/get_data")
-      .then((response) => response.json())
-      .then((data) => {
-        console.log(data);
-        setSpeed(data.speed);
-        setFrontSpeed(data.speed + Math.random() * 3);
-        setRpm(data.rpm);
-        setGear(data.n_gear);
-        setThrottle(data.throttle);
-        setBrake(data.brake);
-        setLapTimeSec(data.estimated_lap_time);
-        setRemainingLaps(30 - data.lap);
-        // let position = 0;
-        // for (let i = 0; i < data.ranking.length; i++) {
-        //   if (data.ranking[i].name === data.info.driver) {
-        //     position = i + 1;
-        //     break;
-        //   }
-        // }
-        // setCurrentPosition(position);
-        const newSuggestions: { [key: string]: string } = {};
-        Object.entries(data.suggestions).forEach(([key, value]: [any, any]) => {
-          newSuggestions[key] = value.toFixed(2).toString();
-        });
-        setSuggestions(newSuggestions);
-        setTimeout(function() {
-          setB(!b);
-        }, 100);
+    // Frames are pushed by the backend on the original telemetry clock
+    const source = new EventSource(import.meta.env.VITE_BACKEND_ENDPOINT + "/stream");
+    source.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      setSpeed(data.speed);
+      setFrontSpeed(data.speed + Math.random() * 3);
+      setRpm(data.rpm);
+      setGear(data.n_gear);
+      setThrottle(data.throttle);
+      setBrake(data.brake);
+      setLapTimeSec(data.estimated_lap_time);
+      setRemainingLaps(30 - data.lap);
+      // let position = 0;
+      // for (let i = 0; i < data.ranking.length; i++) {
+      //   if (data.ranking[i].name === data.info.driver) {
+      //     position = i + 1;
+      //     break;
+      //   }
+      // }
+      // setCurrentPosition(position);
+      const newSuggestions: { [key: string]: string } = {};
+      Object.entries(data.suggestions).forEach(([key, value]: [any, any]) => {
+        newSuggestions[key] = value.toFixed(2).toString();
       });
-  }, [b]);
+      setSuggestions(newSuggestions);
+    };
+    source.addEventListener("end", () => source.close());
+    return () => source.close();
+  }, []);
   
 
   useEffect(() => {